@@ -0,0 +1 @@
+"""Shared helpers for the /api entry points (not deployed as functions)."""
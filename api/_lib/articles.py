@@ -0,0 +1,203 @@
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from . import http_client
+from .trace import stage
+
+# ── SCRAPED ARTICLE STORE ──────────────────────────────────────────
+# The extracted `(title, content)` of every page scraped, keyed by extractor
+# and canonical URL, with the page's ETag / Last-Modified. /api and
+# /api/process-custom extract the same page differently, so each reads and
+# writes its own namespace ('dlf', 'page') and never gets the other's text. For ARTICLE_FRESH seconds a
+# repeat URL is served without touching the network. After that it is
+# revalidated with a conditional GET, and a 304 skips the download and the
+# HTML parsing both. Entries not validated for ARTICLE_TTL expire; past
+# ARTICLE_MAX_ROWS the least recently used go. Same two tiers as the lesson
+# cache: a small LRU in memory over a SQLite file in /tmp.
+
+STORE_PATH = os.environ.get('ARTICLE_STORE_PATH', '/tmp/german_article_articles.sqlite')
+ARTICLE_TTL = int(os.environ.get('ARTICLE_TTL', 24 * 3600))
+ARTICLE_FRESH = int(os.environ.get('ARTICLE_FRESH', 900))
+ARTICLE_MAX_ROWS = int(os.environ.get('ARTICLE_MAX_ROWS', 2000))
+ARTICLE_MEMORY_ROWS = int(os.environ.get('ARTICLE_MEMORY_ROWS', 128))
+
+_TRACKING = ('utm_', 'fbclid', 'gclid', 'mc_', 'wt_', 'at_')
+
+
+def canonical_url(url):
+    """`url` without fragment, tracking parameters, default port or host case."""
+    parts = urlsplit(url.strip())
+    scheme = (parts.scheme or 'https').lower()
+    host = (parts.hostname or '').lower()
+    if parts.port and (scheme, parts.port) not in (('http', 80), ('https', 443)):
+        host = f'{host}:{parts.port}'
+    query = [(k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+             if not k.lower().startswith(_TRACKING)]
+    return urlunsplit((scheme, host, parts.path or '/', urlencode(sorted(query)), ''))
+
+
+def _key(namespace, url):
+    return f'{namespace} {canonical_url(url)}'
+
+
+class ArticleStore:
+    """Extracted articles by URL, revalidated against the origin when stale."""
+
+    def __init__(self, path=STORE_PATH, ttl=ARTICLE_TTL, fresh=ARTICLE_FRESH,
+                 max_rows=ARTICLE_MAX_ROWS, memory_rows=ARTICLE_MEMORY_ROWS):
+        self.path = path
+        self.ttl = ttl
+        self.fresh = fresh
+        self.max_rows = max_rows
+        self.memory_rows = memory_rows
+        self.stats = {'fresh': 0, 'revalidated': 0, 'downloaded': 0, 'evictions': 0}
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+
+    def _conn(self):
+        if self._db is None:
+            try:
+                self._db = sqlite3.connect(self.path, timeout=5, check_same_thread=False)
+                self._db.execute(
+                    'CREATE TABLE IF NOT EXISTS articles ('
+                    'url TEXT PRIMARY KEY, title TEXT NOT NULL, content TEXT NOT NULL, '
+                    'etag TEXT, modified TEXT, checked REAL NOT NULL, used REAL NOT NULL)')
+                self._db.execute('CREATE INDEX IF NOT EXISTS articles_used ON articles(used)')
+                self._db.commit()
+            except sqlite3.Error:
+                # Read-only filesystem or similar: run with the memory tier only.
+                self._db = False
+        return self._db or None
+
+    def _remember(self, url, entry):
+        self._memory[url] = entry
+        self._memory.move_to_end(url)
+        while len(self._memory) > self.memory_rows:
+            self._memory.popitem(last=False)
+
+    def get(self, namespace, url):
+        """Stored entry for `url` (title, content, etag, modified, checked), or None."""
+        url = _key(namespace, url)
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(url)
+            if entry and now - entry['checked'] < self.ttl:
+                self._memory.move_to_end(url)
+                return dict(entry)
+            self._memory.pop(url, None)
+
+            db = self._conn()
+            if not db:
+                return None
+            try:
+                row = db.execute('SELECT title, content, etag, modified, checked FROM articles '
+                                 'WHERE url = ?', (url,)).fetchone()
+                if row and now - row[4] >= self.ttl:
+                    db.execute('DELETE FROM articles WHERE url = ?', (url,))
+                    db.commit()
+                    row = None
+                elif row:
+                    db.execute('UPDATE articles SET used = ? WHERE url = ?', (now, url))
+                    db.commit()
+            except sqlite3.Error:
+                row = None
+            if not row:
+                return None
+            entry = dict(zip(('title', 'content', 'etag', 'modified', 'checked'), row))
+            self._remember(url, entry)
+            return dict(entry)
+
+    def put(self, namespace, url, title, content, etag=None, modified=None):
+        url = _key(namespace, url)
+        now = time.time()
+        with self._lock:
+            self._remember(url, {'title': title, 'content': content, 'etag': etag,
+                                 'modified': modified, 'checked': now})
+            db = self._conn()
+            if not db:
+                return
+            try:
+                db.execute('INSERT OR REPLACE INTO articles '
+                           '(url, title, content, etag, modified, checked, used) '
+                           'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                           (url, title, content, etag, modified, now, now))
+                self._evict(db, now)
+                db.commit()
+            except sqlite3.Error:
+                pass
+
+    def _touch(self, namespace, url):
+        """Mark `url` as just validated (the origin answered 304)."""
+        url = _key(namespace, url)
+        now = time.time()
+        with self._lock:
+            if url in self._memory:
+                self._memory[url]['checked'] = now
+            db = self._conn()
+            if not db:
+                return
+            try:
+                db.execute('UPDATE articles SET checked = ?, used = ? WHERE url = ?', (now, now, url))
+                db.commit()
+            except sqlite3.Error:
+                pass
+
+    def _evict(self, db, now):
+        cur = db.execute('DELETE FROM articles WHERE checked < ?', (now - self.ttl,))
+        evicted = cur.rowcount
+        (count,) = db.execute('SELECT COUNT(*) FROM articles').fetchone()
+        if count > self.max_rows:
+            cur = db.execute(
+                'DELETE FROM articles WHERE url IN '
+                '(SELECT url FROM articles ORDER BY used ASC LIMIT ?)',
+                (count - self.max_rows,))
+            evicted += cur.rowcount
+        self.stats['evictions'] += max(evicted, 0)
+
+    def fresh_article(self, namespace, url):
+        """`(title, content)` if `url` was validated within ARTICLE_FRESH, else None."""
+        with stage('articles'):
+            entry = self.get(namespace, url)
+        if entry and time.time() - entry['checked'] < self.fresh:
+            self.stats['fresh'] += 1
+            return entry['title'], entry['content']
+        return None
+
+    def fetch(self, namespace, url, extract, headers=None, timeout=10):
+        """`(title, content)` for `url`: stored, revalidated, or downloaded.
+
+        `extract(response)` turns a downloaded page into `(title, content)`
+        (and may raise); it only runs when the page has changed. Entries are
+        kept under `namespace`, one per extractor.
+        """
+        with stage('articles'):
+            entry = self.get(namespace, url)
+        if entry and time.time() - entry['checked'] < self.fresh:
+            self.stats['fresh'] += 1
+            return entry['title'], entry['content']
+
+        headers = dict(headers or {})
+        if entry and entry['etag']:
+            headers['If-None-Match'] = entry['etag']
+        if entry and entry['modified']:
+            headers['If-Modified-Since'] = entry['modified']
+        with stage('fetch'):
+            r = http_client.get(url, headers=headers, timeout=timeout)
+        if entry and r.status_code == 304:
+            self._touch(namespace, url)
+            self.stats['revalidated'] += 1
+            return entry['title'], entry['content']
+
+        title, content = extract(r)
+        self.stats['downloaded'] += 1
+        if title and content:
+            self.put(namespace, url, title, content, r.headers.get('ETag'), r.headers.get('Last-Modified'))
+        return title, content
+
+
+ARTICLE_STORE = ArticleStore()
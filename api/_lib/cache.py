@@ -0,0 +1,134 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+# ── LESSON CACHE ───────────────────────────────────────────────────
+# Two tiers: a small in-process LRU that survives warm invocations, and a
+# SQLite file (in /tmp on Vercel) shared by every invocation on the same box.
+
+CACHE_PATH = os.environ.get('LESSON_CACHE_PATH', '/tmp/german_article_lessons.sqlite')
+CACHE_TTL = int(os.environ.get('LESSON_CACHE_TTL', 7 * 24 * 3600))
+CACHE_MAX_ROWS = int(os.environ.get('LESSON_CACHE_MAX_ROWS', 2000))
+CACHE_MEMORY_ROWS = int(os.environ.get('LESSON_CACHE_MEMORY_ROWS', 64))
+
+_SPACE = re.compile(r'\s+')
+
+
+def _normalize(text):
+    text = unicodedata.normalize('NFC', text or '')
+    return _SPACE.sub(' ', text).strip()
+
+
+def lesson_key(title, content, prompt, model):
+    """Content address for a lesson: same inputs + prompt + model -> same key."""
+    h = hashlib.sha256()
+    for part in (_normalize(title), _normalize(content), prompt, model):
+        h.update(part.encode('utf-8'))
+        h.update(b'\x00')
+    return h.hexdigest()
+
+
+class LessonCache:
+    """LRU in memory in front of a TTL/size-bounded SQLite table."""
+
+    def __init__(self, path=CACHE_PATH, ttl=CACHE_TTL, max_rows=CACHE_MAX_ROWS,
+                 memory_rows=CACHE_MEMORY_ROWS):
+        self.path = path
+        self.ttl = ttl
+        self.max_rows = max_rows
+        self.memory_rows = memory_rows
+        self.stats = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'evictions': 0}
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+
+    def _conn(self):
+        if self._db is None:
+            try:
+                self._db = sqlite3.connect(self.path, timeout=5, check_same_thread=False)
+                self._db.execute(
+                    'CREATE TABLE IF NOT EXISTS lessons ('
+                    'key TEXT PRIMARY KEY, body TEXT NOT NULL, '
+                    'created REAL NOT NULL, used REAL NOT NULL)')
+                self._db.execute('CREATE INDEX IF NOT EXISTS lessons_used ON lessons(used)')
+                self._db.commit()
+            except sqlite3.Error:
+                # Read-only filesystem or similar: run with the memory tier only.
+                self._db = False
+        return self._db or None
+
+    def _remember(self, key, created, body):
+        self._memory[key] = (created, body)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_rows:
+            self._memory.popitem(last=False)
+
+    def get(self, key):
+        """Return the cached lesson dict for `key`, or None."""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry and now - entry[0] < self.ttl:
+                self._memory.move_to_end(key)
+                self.stats['memory_hits'] += 1
+                return json.loads(entry[1])
+            self._memory.pop(key, None)
+
+            db = self._conn()
+            row = None
+            if db:
+                try:
+                    row = db.execute('SELECT body, created FROM lessons WHERE key = ?',
+                                     (key,)).fetchone()
+                    if row and now - row[1] >= self.ttl:
+                        db.execute('DELETE FROM lessons WHERE key = ?', (key,))
+                        db.commit()
+                        row = None
+                    elif row:
+                        db.execute('UPDATE lessons SET used = ? WHERE key = ?', (now, key))
+                        db.commit()
+                except sqlite3.Error:
+                    row = None
+            if not row:
+                self.stats['misses'] += 1
+                return None
+            self.stats['disk_hits'] += 1
+            self._remember(key, row[1], row[0])
+            return json.loads(row[0])
+
+    def put(self, key, lesson):
+        now = time.time()
+        body = json.dumps(lesson, ensure_ascii=False)
+        with self._lock:
+            self._remember(key, now, body)
+            db = self._conn()
+            if not db:
+                return
+            try:
+                db.execute('INSERT OR REPLACE INTO lessons (key, body, created, used) '
+                           'VALUES (?, ?, ?, ?)', (key, body, now, now))
+                self._evict(db, now)
+                db.commit()
+            except sqlite3.Error:
+                pass
+
+    def _evict(self, db, now):
+        cur = db.execute('DELETE FROM lessons WHERE created < ?', (now - self.ttl,))
+        evicted = cur.rowcount
+        (count,) = db.execute('SELECT COUNT(*) FROM lessons').fetchone()
+        if count > self.max_rows:
+            cur = db.execute(
+                'DELETE FROM lessons WHERE key IN '
+                '(SELECT key FROM lessons ORDER BY used ASC LIMIT ?)',
+                (count - self.max_rows,))
+            evicted += cur.rowcount
+        self.stats['evictions'] += max(evicted, 0)
+
+
+LESSON_CACHE = LessonCache()
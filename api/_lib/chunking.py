@@ -0,0 +1,325 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain
+
+from .groq import MODEL, chat_completion
+from .nlp import segment
+from .schema import expand_events, expand_lesson, pick, prompt_for
+from .streaming import LessonStreamParser, add_event, lesson_events, parse_lesson
+from .trace import in_context, stage
+
+# ── CHUNKED LESSON GENERATION ──────────────────────────────────────
+# Output tokens dominate generation time, so a long text is split into
+# sentence-aligned chunks whose "content" arrays are generated in parallel,
+# while one small extra call writes title/summary/vocabulary/quiz. Wall-clock
+# time is then bounded by the slowest chunk instead of the whole article.
+
+CHUNK_CHARS = int(os.environ.get('LESSON_CHUNK_CHARS', 2500))
+CHUNK_WORKERS = int(os.environ.get('LESSON_CHUNK_WORKERS', 4))
+# Texts at or below this length go through the single-call prompt.
+CHUNK_THRESHOLD = int(os.environ.get('LESSON_CHUNK_THRESHOLD', 4000))
+# Follow-up requests allowed for one cut-off response before giving up.
+MAX_CONTINUATIONS = int(os.environ.get('LESSON_CONTINUATIONS', 2))
+# Share of new sentences up to which a near-duplicate's lesson is patched.
+PATCH_MAX_NEW = float(os.environ.get('LESSON_PATCH_MAX_NEW', 0.25))
+
+CHUNK_PROMPT_V1 = """You are an expert German language teacher creating interactive learning materials.
+You receive one part of a longer text. If it is not in German, translate it to German first.
+
+Output ONLY valid JSON:
+{
+  "content": [
+    {
+      "sentence_number": 1,
+      "german_sentence": "German sentence.",
+      "english_translation": "English translation.",
+      "word_meanings": { "GermanWord": "English meaning" },
+      "grammar_notes": "Optional grammar note"
+    }
+  ]
+}
+
+Rules:
+- Process EVERY sentence of this part, in order, numbering from 1
+- Include ALL words in word_meanings, strip punctuation from keys
+- Do not stop until the entire part is processed"""
+
+CHUNK_PROMPT_V2 = """You are an expert German language teacher creating interactive learning materials.
+You receive one part of a longer text. If it is not in German, translate it to German first.
+
+Output ONLY valid JSON:
+{
+  "content": [
+    {
+      "n": 1,
+      "de": "German sentence.",
+      "en": "English translation.",
+      "new": { "GermanWord": "English meaning" },
+      "note": "Optional grammar note"
+    }
+  ]
+}
+
+Rules:
+- Process EVERY sentence of this part, in order, numbering from 1
+- "new" gives the meaning of every word of the sentence that did not appear in an earlier sentence of this part; repeat a word only if its meaning differs here. Strip punctuation from keys
+- Do not stop until the entire part is processed"""
+
+CHUNK_PROMPT = pick(CHUNK_PROMPT_V1, CHUNK_PROMPT_V2)
+
+EXTRAS_PROMPT = """You are an expert German language teacher creating interactive learning materials.
+Read the text and write the lesson overview. If it is not in German, use its German translation.
+
+Output ONLY valid JSON:
+{
+  "title": "English translation of the title",
+  "summary": "2-3 sentence English summary",
+  "vocabulary_highlights": [
+    { "word": "german_word", "translation": "English meaning", "usage_example": "Example in German" }
+  ],
+  "quiz": [
+    {
+      "question": "Question in German?",
+      "options": ["A", "B", "C", "D"],
+      "correct_answer": "A",
+      "explanation": "Why A is correct"
+    }
+  ]
+}
+
+Rules:
+- 5-7 quiz questions in German
+- 6-10 vocabulary highlights"""
+
+# Identifies the chunked prompt pair in lesson cache keys.
+CHUNKED_PROMPT_ID = CHUNK_PROMPT + EXTRAS_PROMPT
+
+def chunk_text(text, max_chars=CHUNK_CHARS):
+    """Group whole sentences (and paragraphs) into chunks of about `max_chars`."""
+    chunks = []
+    current = ''
+    for sentence in segment(text):
+        if current and len(current) + len(sentence) + 1 > max_chars:
+            chunks.append(current)
+            current = ''
+        current = f"{current} {sentence}" if current else sentence
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def _payload(system_prompt, user_content, max_tokens):
+    return {
+        "model": MODEL,
+        "messages": [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_content}
+        ],
+        "response_format": {"type": "json_object"},
+        "temperature": 0.3,
+        "max_tokens": max_tokens
+    }
+
+
+def _generate_chunk(title, chunk, api_key, continuations=MAX_CONTINUATIONS):
+    """Content items for one part: raw text, or an nlp.Prepared run of sentences.
+
+    A response cut off part-way keeps its finished sentences; the rest of the
+    part is asked for again, up to `continuations` times.
+    """
+    if isinstance(chunk, str):
+        payload, prepared = _payload(CHUNK_PROMPT, f"Title: {title}\n\nPart:\n{chunk}", 8000), None
+    else:
+        payload, prepared = _payload(prompt_for(CHUNK_PROMPT, chunk), chunk.user_text(title), 8000), chunk
+    text = chat_completion(payload, api_key)
+    with stage('parse'):
+        part, complete = parse_lesson(text)
+        items = [i for i in expand_lesson(part, prepared).get('content') or [] if isinstance(i, dict)]
+    if complete:
+        return items
+    rest = remainder(chunk, items, prepared)
+    if not rest:
+        return items
+    if continuations <= 0:
+        raise Exception("Lesson output was cut off before the end of the text.")
+    with stage('continue'):
+        more = _generate_chunk(title, rest, api_key, continuations - 1)
+    return items + [{**item, 'sentence_number': n} for n, item in enumerate(more, len(items) + 1)]
+
+
+def _generate_extras(title, content, api_key):
+    text = chat_completion(_payload(EXTRAS_PROMPT, f"Title: {title}\n\nContent:\n{content}", 3000), api_key)
+    with stage('parse'):
+        overview, _ = parse_lesson(text)     # a cut-off overview keeps its finished fields
+        overview.pop('content', None)
+        return overview
+
+
+def iter_chunked_lesson(title, content, api_key, workers=CHUNK_WORKERS, prepared=None):
+    """Yield lesson events like LessonStreamParser does, in document order.
+
+    Sentences are released chunk by chunk as soon as every earlier chunk is
+    done, renumbered so `sentence_number` runs 1..N across the whole text.
+    With `prepared` (from nlp.prepare) the chunks are its sentence runs.
+    """
+    chunks = prepared.chunks(CHUNK_CHARS) if prepared else chunk_text(content)
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        extras = pool.submit(in_context(_generate_extras), title, content, api_key)
+        parts = [pool.submit(in_context(_generate_chunk), title, chunk, api_key) for chunk in chunks]
+        overview = None
+        number = 0
+        for part in parts:
+            items = part.result()
+            if overview is None and extras.done():
+                overview = extras.result()
+                for key in ('title', 'summary'):
+                    if key in overview:
+                        yield key, overview[key]
+            for item in items:
+                if not isinstance(item, dict):
+                    continue
+                number += 1
+                yield 'sentence', {**item, 'sentence_number': number}
+        if overview is None:
+            overview = extras.result()
+            for key in ('title', 'summary'):
+                if key in overview:
+                    yield key, overview[key]
+        for key, value in overview.items():
+            if key not in ('title', 'summary', 'content'):
+                yield key, value
+
+
+def generate_chunked_lesson(title, content, api_key, workers=CHUNK_WORKERS, prepared=None):
+    """Run the chunked pipeline to completion and return the merged lesson dict."""
+    lesson = {}
+    for event, value in iter_chunked_lesson(title, content, api_key, workers, prepared):
+        add_event(lesson, event, value)
+    return lesson
+
+
+# ── CONTINUATION ───────────────────────────────────────────────────
+# A response cut off at max_tokens (or a stream that stalls) still holds
+# every sentence finished before the cut. Those are kept, and only the rest
+# of the text — plus the overview, if it never arrived — is requested again,
+# as one short content-only call instead of a whole new lesson.
+
+OVERVIEW_KEYS = ('title', 'summary', 'vocabulary_highlights', 'quiz')
+
+
+def remainder(content, items, prepared=None):
+    """The part of the text that the recovered `items` do not cover yet."""
+    if prepared is not None:
+        numbers = [i.get('sentence_number') for i in items]
+        done = max([n for n in numbers if isinstance(n, int)] or [len(items)])
+        return prepared.after(done) if done < len(prepared.sentences) else None
+    sentences = segment(content)
+    done = len(items)
+    if items:
+        last = ' '.join(str(items[-1].get('german_sentence', '')).split())
+        for i in range(len(sentences) - 1, -1, -1):
+            if sentences[i] == last:
+                done = i + 1
+                break
+    return ' '.join(sentences[done:])
+
+
+def iter_continuation(title, content, lesson, api_key, prepared=None):
+    """Events that complete a cut-off `lesson`: the missing sentences, then overview."""
+    items = lesson.get('content') or []
+    rest = remainder(content, items, prepared)
+    missing = [key for key in OVERVIEW_KEYS if key not in lesson]
+    with stage('continue'), ThreadPoolExecutor(max_workers=2) as pool:
+        extras = pool.submit(in_context(_generate_extras), title, content, api_key) if missing else None
+        more = pool.submit(in_context(_generate_chunk), title, rest, api_key) if rest else None
+        for n, item in enumerate(more.result() if more else [], len(items) + 1):
+            yield 'sentence', {**item, 'sentence_number': n}
+        overview = extras.result() if extras else {}
+    for key in missing:
+        if key in overview:
+            yield key, overview[key]
+
+
+def finish_lesson(title, content, text, api_key, prepared=None):
+    """Lesson dict from a full (non-streamed) response, continued if it was cut off."""
+    with stage('parse'):
+        lesson, complete = parse_lesson(text)
+        lesson = expand_lesson(lesson, prepared)
+    if complete:
+        return lesson
+    finished = {}
+    for event, value in chain(lesson_events(lesson), iter_continuation(title, content, lesson, api_key, prepared)):
+        add_event(finished, event, value)
+    # The usual field order, whichever call each field came from.
+    return {**{key: finished[key] for key in ('title', 'summary', 'content') if key in finished}, **finished}
+
+
+def iter_resumed_lesson(title, content, deltas, api_key, prepared=None):
+    """Expanded lesson events from a streamed response, continued if it is cut off.
+
+    A stream that ends early, or stalls past the read timeout, is picked up
+    from its last finished sentence.
+    """
+    import requests     # already loaded by the time `deltas` has run
+
+    parser = LessonStreamParser()
+
+    def feed():
+        try:
+            for delta in deltas:
+                yield from parser.feed(delta)
+        except requests.RequestException:
+            if not parser.sentences:
+                raise
+
+    lesson = {}
+    for event, value in expand_events(feed(), prepared):
+        add_event(lesson, event, value)
+        yield event, value
+    if not parser.complete:
+        yield from iter_continuation(title, content, lesson, api_key, prepared)
+
+
+# ── NEAR-DUPLICATE PATCHING ────────────────────────────────────────
+# A text that is a near-duplicate of one already made into a lesson (see
+# similar.py) mostly consists of the same sentences. Their items and the
+# overview are reused; only the sentences the old lesson lacks are written,
+# in one content-only call.
+
+def _plain(sentence):
+    return ' '.join(str(sentence or '').split())
+
+
+def reusable_items(lesson, sentences, prepared=None, max_new=PATCH_MAX_NEW):
+    """For each sentence, the matching item of `lesson` or None (to be generated).
+
+    None instead when more than `max_new` of the sentences are new, or when
+    new ones could not be lined up with generated items (no `prepared`).
+    """
+    known = {}
+    for item in lesson.get('content') or []:
+        if isinstance(item, dict):
+            known.setdefault(_plain(item.get('german_sentence')), item)
+    items = [known.get(_plain(s)) for s in sentences]
+    new = items.count(None)
+    if not sentences or new > max_new * len(sentences) or (new and prepared is None):
+        return None
+    return items
+
+
+def iter_patched_lesson(title, lesson, sentences, items, api_key, prepared=None):
+    """Events for `lesson` fitted to `sentences`, generating the `None` items."""
+    for key in ('title', 'summary'):
+        if key in lesson:
+            yield key, lesson[key]
+    missing = [s for s, item in zip(sentences, items) if item is None]
+    made = iter(_generate_chunk(title, prepared.select(missing), api_key) if missing else [])
+    for n, item in enumerate(items, 1):
+        if item is None:
+            item = next(made, None)
+            if item is None:
+                raise Exception("Lesson output was cut off before the end of the text.")
+        yield 'sentence', {**item, 'sentence_number': n}
+    for key, value in lesson.items():
+        if key not in ('title', 'summary', 'content'):
+            yield key, value
@@ -0,0 +1,28 @@
+import os
+
+# ── CPU-BOUND WORK ─────────────────────────────────────────────────
+# PDF text extraction and HTML parsing hold the GIL for as long as they
+# run. On Vercel an instance serves one request at a time, so they simply
+# run inline. The self-hosted server (server.py) serves many requests from
+# one process and hands these calls to a process pool instead, so one big
+# PDF does not stall every other request's threads.
+#
+# Functions sent to the pool must be importable module-level functions of
+# _lib, and their arguments and results picklable.
+
+CPU_WORKERS = int(os.environ.get('CPU_WORKERS', os.cpu_count() or 1))
+
+_pool = None
+
+
+def use_pool(pool):
+    """Run `run()` calls on `pool` (an Executor) from now on; None for inline."""
+    global _pool
+    _pool = pool
+
+
+def run(fn, *args, **kwargs):
+    """`fn(*args, **kwargs)`, in the worker pool if one is installed."""
+    if _pool is None:
+        return fn(*args, **kwargs)
+    return _pool.submit(fn, *args, **kwargs).result()
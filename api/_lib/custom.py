@@ -0,0 +1,250 @@
+import base64
+import json
+import os
+import re
+from urllib.parse import urlparse
+
+from . import cpu, http_client
+from .articles import ARTICLE_STORE
+from .extract import extract_article
+from .hedge import hedged
+from .lesson import LessonGenerator
+from .schema import pick
+from .trace import stage
+
+# The /api/process-custom pipeline — text from a URL or a PDF, and a lesson
+# from any text — shared by that endpoint and the batch jobs in /api/batch.
+
+# Long texts are generated in parallel chunks, so the cap only has to keep a
+# lesson inside the function's time budget.
+MAX_CONTENT_CHARS = int(os.environ.get('MAX_CONTENT_CHARS', 20000))
+
+_BLANK_LINES = re.compile(r'\n{3,}')
+
+# ── PDF EXTRACTION ─────────────────────────────────────────────────
+
+def extract_text_from_pdf(pdf_data, max_chars=MAX_CONTENT_CHARS, pages=None):
+    """Page text in order, stopping as soon as `max_chars` have been collected.
+
+    `pdf_data` is the raw file (bytes/bytearray) or base64 text from the JSON
+    API; `pages` is an optional 1-based, inclusive `(first, last)` range.
+    """
+    return cpu.run(_pdf_text, pdf_data, max_chars, pages)
+
+
+def _pdf_text(pdf_data, max_chars, pages):
+    try:
+        import fitz
+    except ImportError:
+        raise Exception("PDF support unavailable — pymupdf not installed.")
+
+    pdf_bytes = base64.b64decode(pdf_data) if isinstance(pdf_data, str) else pdf_data
+    doc = fitz.open(stream=pdf_bytes, filetype="pdf")
+    try:
+        first, last = pages or (1, None)
+        last = min(last or doc.page_count, doc.page_count)
+        texts = []
+        total = 0
+        for number in range(first - 1, last):
+            text = doc.load_page(number).get_text("text")
+            text = _BLANK_LINES.sub('\n\n', text).strip()
+            if len(text) > 50:
+                texts.append(text)
+                total += len(text) + 2
+                if total > max_chars:
+                    break
+    finally:
+        doc.close()
+
+    if not texts:
+        raise Exception("No selectable text found in PDF. It may be a scanned image.")
+
+    full_text = "\n\n".join(texts)
+    if len(full_text) > max_chars:
+        full_text = full_text[:max_chars] + "\n\n[Truncated...]"
+    return full_text
+
+# ── URL SCRAPING — MULTI-STRATEGY ─────────────────────────────────
+
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+    'Accept-Language': 'de-DE,de;q=0.9,en;q=0.8',
+    'Accept-Encoding': 'gzip, deflate, br',
+    'DNT': '1',
+    'Cache-Control': 'max-age=0',
+}
+
+JINA_READER_URL = os.environ.get('JINA_READER_URL', 'https://r.jina.ai/')
+
+_BARE_URL = re.compile(r'^(https?://|www\.)')
+_MD_LINK = re.compile(r'\[([^\]]+)\]\([^)]+\)')
+_MD_HEADER = re.compile(r'#{1,6}\s+')
+_MD_EMPHASIS = re.compile(r'\*{1,2}([^*]+)\*{1,2}')
+
+def try_jina_reader(url):
+    """Use Jina AI's free r.jina.ai reader — handles JS-rendered pages."""
+    jina_url = f"{JINA_READER_URL}{url}"
+    with stage('jina'):
+        r = http_client.get(jina_url, headers={'Accept': 'text/plain', 'User-Agent': 'Mozilla/5.0'}, timeout=20)
+    if r.status_code != 200:
+        return None, None
+    text = r.text.strip()
+    if len(text) < 200:
+        return None, None
+
+    # Jina returns markdown-like text — extract title from first # line
+    lines = text.split('\n')
+    title = ''
+    content_lines = []
+    for line in lines:
+        stripped = line.strip()
+        if not title and stripped.startswith('# '):
+            title = stripped[2:].strip()
+        elif stripped and not stripped.startswith('```') and not stripped.startswith('!['):
+            # Skip image refs and code blocks, keep prose
+            if not _BARE_URL.match(stripped):
+                content_lines.append(stripped)
+
+    content = '\n'.join(content_lines)
+    # Remove markdown formatting
+    content = _MD_LINK.sub(r'\1', content)          # links
+    content = _MD_HEADER.sub('', content)            # headers
+    content = _MD_EMPHASIS.sub(r'\1', content)      # bold/italic
+    content = _BLANK_LINES.sub('\n\n', content).strip()
+
+    return title or 'Article', content
+
+def try_direct_scrape(url):
+    """Direct HTML fetch, then single-pass extraction (see _lib/extract.py).
+
+    Goes through the article store, so an unchanged page is neither
+    downloaded nor parsed again.
+    """
+    return ARTICLE_STORE.fetch('page', url, _extract_page, HEADERS, timeout=15)
+
+def _extract_page(r):
+    r.raise_for_status()
+
+    # Some sites return JSON with content embedded
+    ct = r.headers.get('Content-Type', '')
+    if 'json' in ct:
+        data = r.json()
+        text = json.dumps(data)
+        return 'Article', text[:6000]
+
+    with stage('extract'):
+        return cpu.run(extract_article, r.text, MAX_CONTENT_CHARS)
+
+def _usable(result):
+    return bool(result and result[0] and result[1] and len(result[1]) > 150)
+
+def scrape_url(url):
+    """Direct scrape first, hedged with the Jina reader; first good result wins."""
+    if not url.startswith(('http://', 'https://')):
+        url = 'https://' + url
+    stored = ARTICLE_STORE.fresh_article('page', url)
+    if _usable(stored):
+        return stored
+
+    # Strategy A: Direct scrape (fastest, works for most sites)
+    # Strategy B: Jina reader (handles JS-rendered / paywalled sites), started
+    # once A is slower than this domain's hedge delay or comes back thin.
+    winner, result, errors = hedged(
+        [('Direct scrape', lambda: try_direct_scrape(url)),
+         ('Jina reader', lambda: try_jina_reader(url))],
+        accept=_usable,
+        domain=urlparse(url).netloc.lower(),
+    )
+    if result:
+        if winner == 'Jina reader':
+            # No validators to revalidate with; refetched once it goes stale.
+            ARTICLE_STORE.put('page', url, *result)
+        return result
+
+    raise Exception(
+        f"Could not extract readable content from this URL.\n"
+        f"The site may require JavaScript or block scrapers.\n"
+        f"Try copying the article text and using PDF upload instead.\n"
+        f"Details: {' | '.join(errors)}"
+    )
+
+# ── AI LESSON GENERATION ───────────────────────────────────────────
+
+SYSTEM_PROMPT_V1 = """You are an expert German language teacher creating interactive learning materials.
+
+Process the provided text into a structured German learning lesson.
+If the text is not in German, translate it to German first, then create the lesson.
+
+Output ONLY valid JSON:
+{
+  "title": "English translation of the title",
+  "summary": "2-3 sentence English summary",
+  "content": [
+    {
+      "sentence_number": 1,
+      "german_sentence": "German sentence.",
+      "english_translation": "English translation.",
+      "word_meanings": { "GermanWord": "English meaning" },
+      "grammar_notes": "Optional grammar note"
+    }
+  ],
+  "vocabulary_highlights": [
+    { "word": "german_word", "translation": "English meaning", "usage_example": "Example in German" }
+  ],
+  "quiz": [
+    {
+      "question": "Question in German?",
+      "options": ["A", "B", "C", "D"],
+      "correct_answer": "A",
+      "explanation": "Why A is correct"
+    }
+  ]
+}
+
+Rules:
+- Process ALL sentences sequentially, number them
+- Include key words in word_meanings, strip punctuation from keys
+- 5-7 quiz questions in German
+- 6-10 vocabulary highlights"""
+
+SYSTEM_PROMPT_V2 = """You are an expert German language teacher creating interactive learning materials.
+
+Process the provided text into a structured German learning lesson.
+If the text is not in German, translate it to German first, then create the lesson.
+
+Output ONLY valid JSON:
+{
+  "title": "English translation of the title",
+  "summary": "2-3 sentence English summary",
+  "content": [
+    {
+      "n": 1,
+      "de": "German sentence.",
+      "en": "English translation.",
+      "new": { "GermanWord": "English meaning" },
+      "note": "Optional grammar note"
+    }
+  ],
+  "vocabulary_highlights": [
+    { "word": "german_word", "translation": "English meaning", "usage_example": "Example in German" }
+  ],
+  "quiz": [
+    {
+      "question": "Question in German?",
+      "options": ["A", "B", "C", "D"],
+      "correct_answer": "A",
+      "explanation": "Why A is correct"
+    }
+  ]
+}
+
+Rules:
+- Process ALL sentences sequentially, number them
+- "new" gives the meaning of each key word of the sentence that did not appear in an earlier sentence; repeat a word only if its meaning differs here. Strip punctuation from keys
+- 5-7 quiz questions in German
+- 6-10 vocabulary highlights"""
+
+SYSTEM_PROMPT = pick(SYSTEM_PROMPT_V1, SYSTEM_PROMPT_V2)
+
+LESSONS = LessonGenerator(SYSTEM_PROMPT)
@@ -0,0 +1,145 @@
+import gzip
+import hashlib
+import json
+import os
+import zlib
+
+# ── RESPONSE DELIVERY ──────────────────────────────────────────────
+# A lesson is 50-150 KB of very repetitive JSON, and the last SSE event
+# carries all of it again. Bodies are serialized compactly (no spaces, UTF-8
+# instead of \u escapes) and compressed with brotli or gzip, whichever the
+# client's Accept-Encoding prefers. Event streams are compressed too, but
+# flushed after every event so each one still arrives at once.
+#
+# 200 responses to GET and HEAD get a strong ETag over the bytes sent, per
+# encoding. A client that sends it back in If-None-Match gets a 304 without
+# a body when nothing changed: a cached lesson fetched by its key (see
+# handler.py) or an unchanged batch job status. POST responses carry no
+# tag; a 304 is only defined for GET and HEAD.
+#
+# brotli is optional (`pip install brotli`); without it gzip is used.
+
+COMPRESS_MIN_BYTES = int(os.environ.get('COMPRESS_MIN_BYTES', 1024))
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5          # 11 is for static assets; 5 costs about as much as gzip -6
+
+
+def _brotli():
+    try:
+        import brotli
+    except ImportError:
+        return None
+    return brotli
+
+
+def encodings():
+    """The content encodings this process can produce, best first."""
+    return ('br', 'gzip') if _brotli() else ('gzip',)
+
+
+def json_body(data):
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def accepted_encoding(header):
+    """'br', 'gzip' or None: the best encoding Accept-Encoding allows that we can produce."""
+    offered = {}
+    for part in (header or '').split(','):
+        name, _, params = part.partition(';')
+        q = 1.0
+        for param in params.split(';'):
+            key, _, value = param.strip().partition('=')
+            if key == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        offered[name.strip().lower()] = q
+
+    def allowed(name):
+        return offered.get(name, offered.get('*', 0.0)) > 0
+
+    if allowed('br') and _brotli():
+        return 'br'
+    if allowed('gzip'):
+        return 'gzip'
+    return None
+
+
+def compress(body, encoding, best=False):
+    """`body` in `encoding`; `best` for static files compressed once, not per request."""
+    if encoding == 'br':
+        return _brotli().compress(body, quality=11 if best else BROTLI_QUALITY)
+    if encoding == 'gzip':
+        return gzip.compress(body, 9 if best else GZIP_LEVEL, mtime=0)
+    return body
+
+
+def strong_etag(body):
+    return '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+
+def etag_matches(if_none_match, etag):
+    """If-None-Match (weak comparison) against `etag`, whatever encoding it was sent in."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    base = etag.removeprefix('W/').strip('"').split('-')[0]
+    for tag in if_none_match.split(','):
+        tag = tag.strip()
+        if tag.startswith('W/'):
+            tag = tag[2:]
+        if tag.strip('"').split('-')[0] == base:
+            return True
+    return False
+
+
+def represent(request_headers, status, body, method='GET'):
+    """`(status, headers, payload)` to send `body` with: a 304, compressed, or as is.
+
+    Only a 200 to a GET or HEAD gets an ETag, and may be answered with a 304.
+    """
+    headers = {'Vary': 'Accept-Encoding'}
+    encoding = None
+    if len(body) >= COMPRESS_MIN_BYTES:
+        encoding = accepted_encoding(request_headers.get('Accept-Encoding'))
+    if status == 200 and method in ('GET', 'HEAD'):
+        tag = strong_etag(body)
+        if encoding:
+            tag = f'{tag[:-1]}-{encoding}"'
+        headers['ETag'] = tag
+        if etag_matches(request_headers.get('If-None-Match'), tag):
+            return 304, headers, b''
+    if encoding:
+        body = compress(body, encoding)
+        headers['Content-Encoding'] = encoding
+    headers['Content-Length'] = str(len(body))
+    return status, headers, body
+
+
+class StreamEncoder:
+    """Compresses a response written in pieces, flushing after each one."""
+
+    def __init__(self, encoding):
+        self.encoding = encoding
+        if encoding == 'br':
+            self._c = _brotli().Compressor(quality=BROTLI_QUALITY)
+        elif encoding == 'gzip':
+            self._c = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+        else:
+            self._c = None
+
+    def encode(self, data):
+        if self._c is None:
+            return data
+        if self.encoding == 'br':
+            return self._c.process(data) + self._c.flush()
+        return self._c.compress(data) + self._c.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        if self._c is None:
+            return b''
+        if self.encoding == 'br':
+            return self._c.finish()
+        return self._c.flush()
@@ -0,0 +1,308 @@
+import json
+import re
+from html.parser import HTMLParser
+
+# ── SINGLE-PASS ARTICLE EXTRACTION ─────────────────────────────────
+# Replaces the BeautifulSoup strategy chain in try_direct_scrape with one
+# streaming pass over the HTML. Nothing is re-walked: each element only
+# records where its text, paragraph mass and text blocks start and end in
+# document-wide running totals, and the totals for any element are the
+# difference between its close and open positions. CPU and memory are
+# linear in the page size however deeply the markup nests.
+#
+# The selection rules are the same as the old chain: JSON-LD article body,
+# then the first selector whose first match has >200 chars of text, then the
+# element with the most paragraph text.
+
+NOISE_TAGS = frozenset({'script', 'style', 'nav', 'footer', 'head',
+                        'aside', 'form', 'iframe', 'noscript'})
+NOISE_CLASS = re.compile(
+    r'(nav|menu|footer|header|sidebar|cookie|popup|banner|social|share|related|comment|ad-|widget|teaser(?!.*text))',
+    re.I)
+VOID_TAGS = frozenset({'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input',
+                       'link', 'meta', 'param', 'source', 'track', 'wbr'})
+BLOCK_TAGS = frozenset({'p', 'h1', 'h2', 'h3', 'li'})
+CLUSTER_TAGS = frozenset({'div', 'section', 'main', 'article'})
+JSONLD_TYPES = ('Article', 'NewsArticle', 'WebPage', 'BlogPosting')
+_SPACE = re.compile(r'\s+')
+
+# Broad selector list including common German news site patterns
+SELECTORS = [
+    # Generic semantic
+    'article', '[role="main"]', 'main',
+    # Common class patterns
+    '.article-body', '.article-content', '.article__body', '.article__content',
+    '.article__text', '.article-text',
+    '.post-content', '.post-body', '.entry-content',
+    '.story-body', '.story-content',
+    '.content-body', '.page-content',
+    '.text-content', '.main-content',
+    # Deutschlandfunk / ARD patterns
+    '.b-content-main', '.articleText', '.article-long-text',
+    '[class*="ArticleBody"]', '[class*="article-body"]',
+    '[class*="articleBody"]', '[class*="ArticleText"]',
+    '[class*="content__text"]', '[class*="contentText"]',
+    # Generic IDs
+    '#article-body', '#content', '#main-content', '#main',
+    # Data attributes
+    '[data-module="articleBody"]', '[data-component="article-body"]',
+]
+
+_SELECTOR = re.compile(r'^(?:(?P<tag>[a-z]+)|\.(?P<cls>[\w-]+)|#(?P<id>[\w-]+)|'
+                       r'\[(?P<attr>[\w-]+)(?P<op>\*?=)"(?P<val>[^"]*)"\])$')
+
+
+def _compile(selector):
+    """Turn one of the simple SELECTORS into a (tag, attrs) -> bool predicate."""
+    m = _SELECTOR.match(selector)
+    if not m:
+        raise ValueError(f"Unsupported selector: {selector}")
+    if m.group('tag'):
+        tag = m.group('tag')
+        return lambda t, a: t == tag
+    if m.group('cls'):
+        cls = m.group('cls')
+        return lambda t, a: cls in (a.get('class') or '').split()
+    if m.group('id'):
+        ident = m.group('id')
+        return lambda t, a: a.get('id') == ident
+    attr, val = m.group('attr'), m.group('val')
+    if m.group('op') == '*=':
+        return lambda t, a: val in (a.get(attr) or '')
+    return lambda t, a: a.get(attr) == val
+
+
+MATCHERS = [_compile(sel) for sel in SELECTORS]
+
+
+def _is_noise(tag, attrs):
+    if tag in NOISE_TAGS:
+        return True
+    classes = attrs.get('class')
+    if not classes:
+        return False
+    return any(NOISE_CLASS.search(c) for c in classes.split()) or bool(NOISE_CLASS.search(classes))
+
+
+class _Node:
+    __slots__ = ('tag', 'noise', 'order', 'slot', 'text_at', 'piece_at', 'block_at',
+                 'para_at', 'paras_at', 'selectors')
+
+    def __init__(self, tag, noise, slot, parser):
+        self.tag = tag
+        self.noise = noise
+        self.order = parser.opened
+        self.slot = slot
+        self.text_at = parser.text_len
+        self.piece_at = len(parser.pieces)
+        self.block_at = len(parser.blocks)
+        self.para_at = parser.para_len
+        self.paras_at = parser.para_count
+        self.selectors = None
+
+
+class _ArticleParser(HTMLParser):
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.stack = []
+        self.noise_depth = 0
+        self.pieces = []            # stripped text runs outside noise, in order
+        self.text_len = 0           # running len(get_text(strip=True))
+        self.blocks = []            # p/h1/h2/h3/li texts, in document order
+        self.opened = 0
+        self.para_len = 0           # running total of qualifying <p> text
+        self.para_count = 0
+        self.first_match = [None] * len(MATCHERS)   # (text_len, block_range)
+        self.best_cluster = None    # ((score, -order), text_len, block_range)
+        self.h1 = None
+        self.og_title = None
+        self.jsonld = []
+        self._jsonld_buf = None
+
+    def handle_starttag(self, tag, attrs):
+        attrs = {k: v or '' for k, v in attrs}
+        if tag == 'meta' and attrs.get('property') == 'og:title' and self.og_title is None:
+            self.og_title = attrs.get('content')
+        if tag == 'script' and attrs.get('type') == 'application/ld+json':
+            self._jsonld_buf = []
+        if tag in VOID_TAGS:
+            return
+
+        noise = self.noise_depth > 0 or _is_noise(tag, attrs)
+        self.opened += 1
+        if not noise and tag in BLOCK_TAGS:
+            # Reserve the block's slot now so blocks stay in document order.
+            self.blocks.append(None)
+            slot = len(self.blocks) - 1
+        else:
+            slot = None
+        node = _Node(tag, noise, slot, self)
+        if noise:
+            self.noise_depth += 1
+        else:
+            hits = [i for i, match in enumerate(MATCHERS)
+                    if self.first_match[i] is None and match(tag, attrs)]
+            node.selectors = hits or None
+        self.stack.append(node)
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag not in VOID_TAGS:
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        if tag == 'script' and self._jsonld_buf is not None:
+            self.jsonld.append(''.join(self._jsonld_buf))
+            self._jsonld_buf = None
+        # Like BeautifulSoup: close up to the nearest matching open tag,
+        # ignore stray end tags.
+        for depth in range(len(self.stack) - 1, -1, -1):
+            if self.stack[depth].tag == tag:
+                break
+        else:
+            return
+        while len(self.stack) > depth:
+            self._close(self.stack.pop())
+
+    def handle_data(self, data):
+        if self._jsonld_buf is not None:
+            self._jsonld_buf.append(data)
+        if self.noise_depth:
+            return
+        text = data.strip()
+        if text:
+            self.pieces.append(text)
+            self.text_len += len(text)
+
+    def close(self):
+        super().close()
+        while self.stack:
+            self._close(self.stack.pop())
+
+    def _close(self, node):
+        if node.noise:
+            self.noise_depth -= 1
+            return
+        text_len = self.text_len - node.text_at
+        tag = node.tag
+
+        if tag == 'h1' and self.h1 is None:
+            self.h1 = ''.join(self.pieces[node.piece_at:])
+
+        if node.slot is not None:
+            text = _SPACE.sub(' ', ' '.join(self.pieces[node.piece_at:])).strip()
+            self.blocks[node.slot] = text
+
+        if tag == 'p' and text_len > 20:
+            self.para_len += text_len
+            self.para_count += 1
+
+        # Descendant blocks only: the element's own slot comes before block_at.
+        block_range = (node.block_at, len(self.blocks))
+        if node.selectors:
+            for i in node.selectors:
+                self.first_match[i] = (text_len, block_range)
+
+        if tag in CLUSTER_TAGS:
+            count = self.para_count - node.paras_at
+            score = self.para_len - node.para_at + max(count - 1, 0)
+            # Ties go to the element that opened first, as in a top-down scan.
+            rank = (score, -node.order)
+            if score > 0 and (self.best_cluster is None or rank > self.best_cluster[0]):
+                self.best_cluster = (rank, text_len, block_range)
+
+
+def _from_jsonld(scripts, max_chars):
+    for raw in scripts:
+        try:
+            data = json.loads(raw or '')
+            # Handle @graph arrays
+            items = data.get('@graph', [data]) if isinstance(data, dict) else data
+            if isinstance(items, dict):
+                items = [items]
+            for item in items:
+                if item.get('@type') in JSONLD_TYPES:
+                    body = item.get('articleBody') or item.get('description') or ''
+                    headline = item.get('headline') or item.get('name') or ''
+                    if len(body) > 200:
+                        return headline, body[:max_chars]
+        except Exception:
+            pass
+    return None
+
+
+def extract_article(html, max_chars=20000):
+    """Return `(title, content)` for an HTML page, or `(None, None)`."""
+    parser = _ArticleParser()
+    parser.feed(html)
+    parser.close()
+
+    found = _from_jsonld(parser.jsonld, max_chars)
+    if found:
+        return found
+
+    chosen = None
+    for match in parser.first_match:
+        if match and match[0] > 200:
+            chosen = match
+            break
+    if chosen is None and parser.best_cluster:
+        chosen = parser.best_cluster[1:]
+    if not chosen or chosen[0] < 150:
+        return None, None
+
+    start, end = chosen[1]
+    seen = set()
+    unique = []
+    for text in parser.blocks[start:end]:
+        if text and len(text) > 25 and text[:60] not in seen:
+            seen.add(text[:60])
+            unique.append(text)
+    if not unique:
+        return None, None
+
+    title = parser.h1 or parser.og_title or 'Article'
+    content = '\n\n'.join(unique)
+    if len(content) > max_chars:
+        content = content[:max_chars] + "\n\n[Truncated...]"
+    return title, content
+
+
+# ── DEUTSCHLANDFUNK ARTICLES ───────────────────────────────────────
+# The random-article route knows the markup of its own feed's pages, so it
+# reads the intro, body and glossary boxes directly.
+
+def extract_dlf_article(html):
+    """Return `(title, content)` for a deutschlandfunk.de article page."""
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(html, 'html.parser')
+
+    title_tag = soup.find('h1') or soup.find('h2')
+    title = title_tag.get_text(strip=True) if title_tag else "No Title Found"
+
+    content_lines = []
+
+    intro_para = soup.find('p', class_='article-header-description')
+    if intro_para:
+        intro_text = intro_para.get_text(strip=True)
+        if len(intro_text) > 20:
+            content_lines.append(intro_text)
+
+    for div in soup.find_all('div', class_='article-details-text'):
+        text = div.get_text(strip=True)
+        if len(text) > 20:
+            content_lines.append(text)
+
+    for title_elem, desc_elem in zip(
+        soup.find_all('h3', class_='teaser-word-title'),
+        soup.find_all('p', class_='teaser-word-description')
+    ):
+        word = title_elem.get_text(strip=True)
+        definition = desc_elem.get_text(strip=True)
+        if word and definition:
+            content_lines.append(f"{word}: {definition}")
+
+    content = " ".join(content_lines)
+    content = _SPACE.sub(' ', content).strip()
+    return title, content
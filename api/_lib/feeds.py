@@ -0,0 +1,122 @@
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from . import http_client
+
+# ── RSS FEED INDEX ─────────────────────────────────────────────────
+# Keeps the filtered article links of every feed in memory. All feeds are
+# fetched concurrently with conditional GETs; once warm, picking an article
+# never waits on the network and a failing feed just keeps its last items.
+
+# RSS_FEEDS (comma-separated) overrides the list, e.g. for the offline benchmark.
+RSS_LINKS = [u for u in os.environ.get('RSS_FEEDS', '').split(',') if u] or [
+    "https://www.deutschlandfunk.de/nachrichten-100.rss",
+    "https://www.deutschlandfunk.de/politikportal-100.rss",
+    "https://www.deutschlandfunk.de/wirtschaft-106.rss",
+    "https://www.deutschlandfunk.de/wissen-106.rss",
+    "https://www.deutschlandfunk.de/kulturportal-100.rss",
+    "https://www.deutschlandfunk.de/europa-112.rss",
+    "https://www.deutschlandfunk.de/gesellschaft-106.rss",
+    "https://www.deutschlandfunk.de/sportportal-100.rss",
+]
+
+FEED_TTL = int(os.environ.get('FEED_TTL', 300))
+FEED_HEADERS = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64)'}
+
+
+def parse_feed_links(xml_bytes):
+    """Article links from an RSS document, minus index pages and podcasts."""
+    import xml.etree.ElementTree as ET
+
+    root = ET.fromstring(xml_bytes)
+    links = []
+    for item in root.findall('.//item'):
+        link = item.find('link')
+        if link is not None and link.text:
+            url = link.text.strip()
+            if url.endswith('.html') and "-100.html" not in url and "podcast" not in url:
+                links.append(url)
+    return links
+
+
+class FeedIndex:
+    """In-memory, TTL-refreshed index of article links across all feeds."""
+
+    def __init__(self, feeds=RSS_LINKS, ttl=FEED_TTL):
+        self.feeds = list(feeds)
+        self.ttl = ttl
+        self._state = {feed: {'etag': None, 'modified': None, 'links': []} for feed in self.feeds}
+        self._refreshed_at = 0.0
+        self._lock = threading.Lock()
+        self._refreshing = False
+
+    def _fetch(self, feed):
+        state = self._state[feed]
+        headers = dict(FEED_HEADERS)
+        if state['etag']:
+            headers['If-None-Match'] = state['etag']
+        if state['modified']:
+            headers['If-Modified-Since'] = state['modified']
+        try:
+            r = http_client.get(feed, headers=headers, timeout=10)
+            if r.status_code == 304:
+                return
+            r.raise_for_status()
+            links = parse_feed_links(r.content)
+        except Exception:
+            # Upstream outage or bad XML: keep serving the previous items.
+            return
+        state['etag'] = r.headers.get('ETag')
+        state['modified'] = r.headers.get('Last-Modified')
+        if links:
+            state['links'] = links
+
+    def refresh(self):
+        """Fetch every feed concurrently (conditional GET) and update the index."""
+        with ThreadPoolExecutor(max_workers=len(self.feeds)) as pool:
+            list(pool.map(self._fetch, self.feeds))
+        with self._lock:
+            self._refreshed_at = time.time()
+            self._refreshing = False
+
+    def refresh_if_stale(self):
+        """refresh() unless the index was refreshed within the TTL."""
+        if time.time() - self._refreshed_at > self.ttl:
+            self.refresh()
+
+    def _refresh_in_background(self):
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+        threading.Thread(target=self.refresh, daemon=True).start()
+
+    def links(self, feed=None):
+        if feed is not None:
+            return list(self._state[feed]['links'])
+        return [url for feed in self.feeds for url in self._state[feed]['links']]
+
+    def random_url(self, feed=None):
+        """Random article link; picks a feed first so every category is equally likely."""
+        stale = time.time() - self._refreshed_at > self.ttl
+        populated = [f for f in self.feeds if self._state[f]['links']]
+        if not populated:
+            self.refresh()
+            populated = [f for f in self.feeds if self._state[f]['links']]
+        elif stale:
+            self._refresh_in_background()
+
+        if feed is None:
+            if not populated:
+                raise Exception("Could not find any valid article links.")
+            feed = random.choice(populated)
+        links = self._state[feed]['links']
+        if not links:
+            raise Exception("Could not find any valid article links.")
+        return random.choice(links)
+
+
+FEED_INDEX = FeedIndex()
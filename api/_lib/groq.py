@@ -0,0 +1,302 @@
+import email.utils
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import Future
+
+from . import http_client
+from .trace import add_usage, stage
+
+# ── GROQ CHAT COMPLETIONS ──────────────────────────────────────────
+# Plain HTTP against the OpenAI-compatible endpoint — no SDK needed.
+#
+# Every call goes through `send()`, which keeps each API key inside a local
+# requests/tokens-per-minute budget and retries 429s and gateway errors with
+# jittered backoff, honouring Retry-After. Identical non-streamed requests
+# that are in flight at the same time share one upstream call.
+#
+# Budgets are per process: on Vercel each warm instance keeps its own, and
+# Groq's x-ratelimit-* headers pull them back in line with the real quota.
+
+GROQ_URL = os.environ.get('GROQ_API_URL', "https://api.groq.com/openai/v1/chat/completions")
+MODEL = "llama-3.3-70b-versatile"
+
+GROQ_RPM = int(os.environ.get('GROQ_RPM', 30))
+GROQ_TPM = int(os.environ.get('GROQ_TPM', 12000))
+GROQ_RETRIES = int(os.environ.get('GROQ_RETRIES', 3))
+GROQ_MAX_WAIT = float(os.environ.get('GROQ_MAX_WAIT', 20))    # seconds of waiting per call, in total
+BACKOFF_BASE = 0.5
+BACKOFF_CAP = 8.0
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+CHARS_PER_TOKEN = 4
+
+RATE_LIMIT_ERROR = "rate_limit: Too many requests. Please wait a moment and try again."
+
+
+def failed_generation(r):
+    """Partial output of a JSON-mode request Groq refused as invalid JSON, or None.
+
+    Groq answers 400 json_validate_failed when the JSON is broken, most often
+    because it was cut off at max_tokens; the text is still worth parsing.
+    """
+    if r.status_code != 400:
+        return None
+    try:
+        error = r.json().get('error') or {}
+    except ValueError:
+        return None
+    if error.get('code') != 'json_validate_failed':
+        return None
+    return error.get('failed_generation') or None
+
+
+def raise_for_groq_status(r):
+    """Turn Groq error statuses into the messages index.html knows how to show."""
+    if r.status_code == 401:
+        raise Exception("invalid_api_key: Your Groq API key is invalid or expired.")
+    if r.status_code == 429:
+        raise Exception(RATE_LIMIT_ERROR)
+    if r.status_code != 200:
+        raise Exception(f"groq_error_{r.status_code}: {r.text[:200]}")
+
+
+# ── PER-KEY BUDGETS ────────────────────────────────────────────────
+
+class TokenBucket:
+    """Refills `per_minute` units per minute, up to one minute's worth.
+
+    Units are taken as soon as they are reserved (the level may go negative)
+    and the caller sleeps off the deficit, so concurrent callers queue up in
+    order instead of racing for the same refill.
+    """
+
+    def __init__(self, per_minute):
+        self.per_minute = per_minute
+        self.level = float(per_minute)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def _refill(self, now):
+        self.level = min(self.per_minute, self.level + (now - self.updated) * self.per_minute / 60)
+        self.updated = now
+
+    def wait_for(self, n, now):
+        self._refill(now)
+        n = min(n, self.per_minute)
+        wait = max(0.0, (n - self.level) * 60 / self.per_minute)
+        return max(wait, self.blocked_until - now)
+
+    def take(self, n):
+        self.level -= n
+
+    def sync(self, limit, remaining, now):
+        """Adopt the limit and remaining quota the server reported."""
+        self._refill(now)
+        if limit:
+            self.per_minute = limit
+        if remaining is not None:
+            self.level = min(self.level, remaining)
+
+    def block(self, seconds, now):
+        self.blocked_until = max(self.blocked_until, now + seconds)
+
+
+class KeyBudget:
+    """Requests- and tokens-per-minute buckets for one API key."""
+
+    def __init__(self, rpm=GROQ_RPM, tpm=GROQ_TPM):
+        self.requests = TokenBucket(rpm) if rpm > 0 else None
+        self.tokens = TokenBucket(tpm) if tpm > 0 else None
+        self._lock = threading.Lock()
+
+    def _buckets(self):
+        return [b for b in (self.requests, self.tokens) if b]
+
+    def reserve(self, tokens, max_wait):
+        """Reserve one request and `tokens`; seconds to wait, or None if over `max_wait`."""
+        with self._lock:
+            now = time.monotonic()
+            wait = max([0.0] + [b.wait_for(n, now) for b, n in self._pairs(tokens)])
+            if wait > max_wait:
+                return None
+            for b, n in self._pairs(tokens):
+                b.take(n)
+            return wait
+
+    def _pairs(self, tokens):
+        return [(b, n) for b, n in ((self.requests, 1), (self.tokens, tokens)) if b]
+
+    def charge(self, tokens):
+        """Count tokens that were only known after the response (the completion)."""
+        if self.tokens and tokens:
+            with self._lock:
+                self.tokens.take(tokens)
+
+    def observe(self, headers):
+        """Follow Groq's x-ratelimit-*-tokens headers when they are present."""
+        if not self.tokens or 'x-ratelimit-limit-tokens' not in headers:
+            return
+        try:
+            limit = int(headers['x-ratelimit-limit-tokens'])
+            remaining = int(headers.get('x-ratelimit-remaining-tokens', limit))
+        except ValueError:
+            return
+        with self._lock:
+            self.tokens.sync(limit, remaining, time.monotonic())
+
+    def block(self, seconds):
+        """Hold every call on this key for `seconds` (after a 429)."""
+        with self._lock:
+            now = time.monotonic()
+            for b in self._buckets():
+                b.block(seconds, now)
+
+
+_budgets = {}
+_budgets_lock = threading.Lock()
+
+
+def budget_for(api_key):
+    # Keyed by a digest so raw keys are not kept around in memory longer than needed.
+    digest = hashlib.sha256(api_key.encode('utf-8')).hexdigest()
+    with _budgets_lock:
+        if digest not in _budgets:
+            _budgets[digest] = KeyBudget()
+        return _budgets[digest]
+
+
+def estimate_tokens(payload):
+    """Prompt tokens, roughly; the completion is charged once it is known."""
+    return sum(len(m.get('content') or '') for m in payload.get('messages', [])) // CHARS_PER_TOKEN
+
+
+def _retry_after(r):
+    value = r.headers.get('Retry-After')
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        try:
+            return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+
+def _backoff(attempt):
+    # Full jitter: spreads out the retries of requests that failed together.
+    return random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+
+
+def send(payload, api_key, url=None, timeout=90, stream=False):
+    """POST `payload` within the key's budget, retrying 429/5xx.
+
+    Returns the 200 response, or a 400 that still carries a failed_generation.
+    """
+    import requests     # loaded with the session; see http_client
+
+    headers = {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
+    budget = budget_for(api_key)
+    tokens = estimate_tokens(payload)
+    waited = 0.0
+    attempt = 0
+    while True:
+        delay = budget.reserve(tokens, GROQ_MAX_WAIT - waited)
+        if delay is None:
+            raise Exception(RATE_LIMIT_ERROR)
+        if delay:
+            with stage('groq_wait'):
+                time.sleep(delay)
+            waited += delay
+
+        try:
+            r = http_client.post(url or GROQ_URL, headers=headers, json=payload,
+                                 timeout=timeout, stream=stream)
+        except requests.ConnectionError:
+            pause = _backoff(attempt)
+            if attempt >= GROQ_RETRIES or waited + pause > GROQ_MAX_WAIT:
+                raise
+        else:
+            budget.observe(r.headers)
+            if r.status_code not in RETRY_STATUSES or attempt >= GROQ_RETRIES:
+                if failed_generation(r) is None:
+                    raise_for_groq_status(r)
+                return r
+            pause = _retry_after(r)
+            if pause is None:
+                pause = _backoff(attempt)
+            if r.status_code == 429:
+                # Everyone on this key waits it out; the next reserve() sleeps
+                # (or gives up at once if the wait would not fit in GROQ_MAX_WAIT).
+                budget.block(pause)
+                pause = 0.0
+            elif waited + pause > GROQ_MAX_WAIT:
+                raise_for_groq_status(r)
+            r.close()
+
+        if pause:
+            with stage('groq_wait'):
+                time.sleep(pause)
+            waited += pause
+        attempt += 1
+
+
+# ── COALESCING ─────────────────────────────────────────────────────
+
+_inflight = {}
+_inflight_lock = threading.Lock()
+
+
+def _request_key(payload, url):
+    blob = json.dumps([url or GROQ_URL, payload], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(blob.encode('utf-8')).hexdigest()
+
+
+def _complete(payload, api_key, url, timeout):
+    with stage('groq'):
+        r = send(payload, api_key, url, timeout)
+        data = r.json()
+    if r.status_code != 200:
+        text = failed_generation(r)
+        budget_for(api_key).charge(len(text) // CHARS_PER_TOKEN)
+        return text
+    usage = data.get('usage') or {}
+    add_usage(usage)
+    budget_for(api_key).charge(usage.get('completion_tokens'))
+    return data['choices'][0]['message']['content']
+
+
+def chat_completion(payload, api_key, url=None, timeout=90):
+    """POST a chat completion and return the assistant message text.
+
+    If the same request is already in flight, wait for its answer instead of
+    sending another. Should that call fail, each waiter falls back to its own
+    request, since the failure may belong to the other caller's API key.
+    """
+    key = _request_key(payload, url)
+    with _inflight_lock:
+        call = _inflight.get(key)
+        leader = call is None
+        if leader:
+            call = _inflight[key] = Future()
+
+    if not leader:
+        try:
+            with stage('groq_coalesced'):
+                return call.result()
+        except Exception:
+            return _complete(payload, api_key, url, timeout)
+
+    try:
+        text = _complete(payload, api_key, url, timeout)
+        call.set_result(text)
+        return text
+    except Exception as e:
+        call.set_exception(e)
+        raise
+    finally:
+        with _inflight_lock:
+            _inflight.pop(key, None)
@@ -0,0 +1,129 @@
+import datetime
+from urllib.parse import urlparse
+
+from .cache import LESSON_CACHE
+from .delivery import StreamEncoder, accepted_encoding, json_body, represent
+from .streaming import add_event, sse_event
+from .trace import current, stage
+
+# ── SHARED HANDLER METHODS ─────────────────────────────────────────
+# Everything the /api handlers send goes through these: JSON responses
+# (compressed, with ETags), Server-Sent Event streams (compressed and
+# flushed per event) and lessons in either form, with the request trace
+# finished and reported in Server-Timing. Each handler mixes ApiResponses
+# into its BaseHTTPRequestHandler and sets its own CORS lists.
+#
+# A generated lesson comes with a `lesson_url`: GET <handler>?lesson=<key>
+# returns it from the lesson cache without generated_at or source_url, so
+# its bytes only change with the lesson and a strong ETag can revalidate it.
+
+
+class ApiResponses:
+    """Response helpers for a BaseHTTPRequestHandler."""
+
+    CORS_METHODS = 'POST, OPTIONS'
+    CORS_HEADERS = 'Content-Type, If-None-Match'
+    CORS_EXPOSE = 'Server-Timing, ETag'
+
+    def do_OPTIONS(self):
+        self.send_response(200)
+        self._cors()
+        self.end_headers()
+
+    def _cors(self):
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.send_header('Access-Control-Allow-Methods', self.CORS_METHODS)
+        self.send_header('Access-Control-Allow-Headers', self.CORS_HEADERS)
+        self.send_header('Access-Control-Expose-Headers', self.CORS_EXPOSE)
+        self.send_header('Timing-Allow-Origin', '*')
+
+    def _respond(self, status, data, headers=None, error=None):
+        trace = current()
+        with stage('serialize'):
+            status, sent, body = represent(self.headers, status, json_body(data), self.command)
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        for name, value in {**(headers or {}), **sent}.items():
+            self.send_header(name, value)
+        self.send_header('Server-Timing', trace.server_timing())
+        self._cors()
+        self.end_headers()
+        self.wfile.write(body)
+        trace.finish(status, error=error)
+
+    def _lesson_url(self, key):
+        return f'{urlparse(self.path).path}?lesson={key}' if key else None
+
+    def _send_lesson(self, source_url, lesson, cache_status, key=None):
+        """The lesson as one JSON response, with the URL it can be fetched again from."""
+        current().set(cache=cache_status)
+        self._respond(200, {
+            'success': True,
+            'data': {
+                'source_url': source_url,
+                'generated_at': datetime.datetime.now().isoformat(),
+                'lesson_url': self._lesson_url(key),
+                **lesson
+            }
+        }, {'X-Lesson-Cache': cache_status})
+
+    def _send_cached_lesson(self, key):
+        """GET ?lesson=<key>: the cached lesson, revalidated with If-None-Match."""
+        lesson = LESSON_CACHE.get(key) if key else None
+        if lesson is None:
+            self._respond(404, {'success': False, 'error': 'Lesson not cached'})
+            return
+        current().set(cache='hit')
+        self._respond(200, {'success': True, 'data': {'lesson_key': key, **lesson}},
+                      {'Cache-Control': 'no-cache'})
+
+    def _start_events(self):
+        """Send the headers of a 200 event stream, compressed if the client accepts it.
+
+        Server-Timing can only carry what happened before the headers; the
+        log line written at the end has the later stages too.
+        """
+        encoding = accepted_encoding(self.headers.get('Accept-Encoding'))
+        self._events = StreamEncoder(encoding)
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('X-Accel-Buffering', 'no')
+        if encoding:
+            self.send_header('Content-Encoding', encoding)
+            self.send_header('Vary', 'Accept-Encoding')
+        self.send_header('Server-Timing', current().server_timing())
+        self._cors()
+        self.end_headers()
+
+    def _send_event(self, event, data):
+        self.wfile.write(self._events.encode(sse_event(event, data)))
+        self.wfile.flush()
+
+    def _end_events(self):
+        self.wfile.write(self._events.finish())
+
+    def _stream_lesson(self, cache_status, events, key, source_url, **fields):
+        """Send the lesson as Server-Sent Events, one sentence at a time.
+
+        `cache_status`, `events` and `key` as LessonGenerator.stream() returns
+        them (`key` None for a lesson that is not cached); `fields` go on the
+        request's trace.
+        """
+        trace = current()
+        self._start_events()
+        meta = {'source_url': source_url, 'generated_at': datetime.datetime.now().isoformat()}
+        self._send_event('meta', {**meta, 'cache': cache_status})
+        trace.set(cache=cache_status, stream=True, **fields)
+        try:
+            with stage('generate'):
+                lesson = {}
+                for event, value in events:
+                    self._send_event(event, value)
+                    add_event(lesson, event, value)
+            self._send_event('done', {**meta, 'lesson_url': self._lesson_url(key), **lesson})
+            trace.finish(200)
+        except Exception as e:
+            self._send_event('error', {'success': False, 'error': str(e), 'stage': trace.failed_stage})
+            trace.finish(200, error=e)
+        self._end_events()
@@ -0,0 +1,144 @@
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from .trace import in_context
+
+# ── HEDGED STRATEGIES ──────────────────────────────────────────────
+# Run a primary strategy and, if it is slow or its result is no good, a
+# backup in parallel; return the first acceptable result. Losers cannot be
+# interrupted mid-request (their own HTTP timeouts bound them), but their
+# results are dropped and backups that have not started yet are cancelled.
+
+HEDGE_DELAY = float(os.environ.get('SCRAPE_HEDGE_DELAY', 4.0))
+HEDGE_MIN_DELAY = 0.5
+HEDGE_MAX_DELAY = 10.0
+STATS_WINDOW = 50           # latencies kept per (domain, strategy)
+STATS_MIN_RUNS = 5          # runs before a domain's own numbers are trusted
+
+# server.py raises this to match its --max-active before the handlers load.
+_pool = ThreadPoolExecutor(max_workers=int(os.environ.get('SCRAPE_WORKERS', 8)))
+
+
+class StrategyStats:
+    """Per-domain win rates and latencies for each strategy."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._data = defaultdict(lambda: {'runs': 0, 'ok': 0, 'wins': 0,
+                                          'latency': deque(maxlen=STATS_WINDOW)})
+
+    def record(self, domain, strategy, seconds, ok, won):
+        with self._lock:
+            entry = self._data[(domain, strategy)]
+            entry['runs'] += 1
+            entry['ok'] += ok
+            entry['wins'] += won
+            if ok:
+                entry['latency'].append(seconds)
+
+    def delay_for(self, domain, strategy, default=HEDGE_DELAY):
+        """Hedge delay for `domain`: ~p90 of the primary's good latencies.
+
+        A primary that usually fails on this domain gets no head start.
+        """
+        with self._lock:
+            entry = self._data.get((domain, strategy))
+            if not entry or entry['runs'] < STATS_MIN_RUNS:
+                return default
+            if entry['ok'] / entry['runs'] < 0.5:
+                return 0.0
+            latencies = sorted(entry['latency'])
+        if not latencies:
+            return default
+        p90 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.9))]
+        return max(HEDGE_MIN_DELAY, min(HEDGE_MAX_DELAY, p90))
+
+    def snapshot(self):
+        with self._lock:
+            out = {}
+            for (domain, strategy), e in self._data.items():
+                lat = sorted(e['latency'])
+                out.setdefault(domain, {})[strategy] = {
+                    'runs': e['runs'],
+                    'win_rate': round(e['wins'] / e['runs'], 3) if e['runs'] else 0.0,
+                    'ok_rate': round(e['ok'] / e['runs'], 3) if e['runs'] else 0.0,
+                    'p50_ms': round(lat[len(lat) // 2] * 1000) if lat else None,
+                }
+            return out
+
+
+SCRAPE_STATS = StrategyStats()
+
+
+def hedged(strategies, accept, domain, stats=SCRAPE_STATS, delay=None):
+    """Run `(name, fn)` strategies with hedging; return `(name, result, errors)`.
+
+    The first strategy starts at once. The next one starts once the last
+    one started has been running for the hedge delay, or straight away
+    when every running strategy has finished without an acceptable result.
+    Time spent queued for a worker counts towards neither the delay nor
+    the latency stats. `result` is None when nothing passed.
+    """
+    primary = strategies[0][0]
+    if delay is None:
+        delay = stats.delay_for(domain, primary)
+    pending = {}
+    errors = []
+    queue = list(strategies)
+    winner = None
+    latest = {}
+
+    def start():
+        nonlocal latest
+        name, fn = queue.pop(0)
+        latest = began = {}
+
+        def run():
+            began['at'] = time.perf_counter()
+            return fn()
+
+        pending[_pool.submit(in_context(run))] = (name, began)
+
+    def running_for(began):
+        return time.perf_counter() - began['at'] if 'at' in began else 0.0
+
+    start()
+    while pending:
+        timeout = max(delay - running_for(latest), 0.0) if queue else None
+        done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+        if not done:
+            if running_for(latest) >= delay:
+                start()     # hedge: the running strategy is taking too long
+            continue
+        for future in done:
+            name, began = pending.pop(future)
+            elapsed = running_for(began)
+            try:
+                result = future.result()
+                ok = accept(result)
+                if not ok:
+                    errors.append(f"{name}: insufficient content")
+            except Exception as e:
+                result, ok = None, False
+                errors.append(f"{name}: {str(e)[:80]}")
+            stats.record(domain, name, elapsed, ok, ok and winner is None)
+            if ok and winner is None:
+                winner = (name, result)
+        if winner:
+            break
+        if queue and not pending:
+            start()     # everything running has failed; don't wait out the delay
+
+    for future, (name, began) in pending.items():
+        if not future.cancel():
+            # Still running: keep its numbers for tuning, drop its result.
+            future.add_done_callback(
+                lambda f, name=name, began=began: stats.record(
+                    domain, name, running_for(began),
+                    not f.exception() and accept(f.result()), False))
+    if winner:
+        return winner[0], winner[1], errors
+    return None, None, errors
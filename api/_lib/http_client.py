@@ -0,0 +1,76 @@
+import os
+import threading
+
+# ── SHARED HTTP SESSION ────────────────────────────────────────────
+# Pooled, keep-alive sessions per process: one for GETs and one, without
+# retries, for the Groq POSTs. They live at module level so warm serverless
+# invocations reuse the open connections (and TLS sessions) to api.groq.com,
+# deutschlandfunk.de and r.jina.ai instead of handshaking on every call.
+#
+# requests (with urllib3 and certifi) is most of a handler's cold-start
+# import time, so it is imported when the first request is made rather than
+# when a handler module loads: a request answered from the lesson pool or
+# cache never pays for it.
+
+POOL_HOSTS = int(os.environ.get('HTTP_POOL_HOSTS', 16))
+POOL_PER_HOST = int(os.environ.get('HTTP_POOL_PER_HOST', 8))
+CONNECT_TIMEOUT = float(os.environ.get('HTTP_CONNECT_TIMEOUT', 5))
+
+_sessions = {}
+_lock = threading.Lock()
+
+
+def _retry():
+    from urllib3.util.retry import Retry
+
+    # Connection failures are always safe to retry (nothing was sent), and
+    # gateway errors are retried for GET only.
+    return Retry(
+        total=2,
+        connect=2,
+        read=0,
+        status=2,
+        backoff_factor=0.3,
+        status_forcelist=(502, 503, 504),
+        allowed_methods=frozenset({'GET', 'HEAD'}),
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+
+
+def session(retries=True):
+    """The process-wide pooled session, created on first use.
+
+    With `retries` False, urllib3 retries nothing: Groq POSTs are retried
+    (and charged to the key's budget) by groq.send alone.
+    """
+    s = _sessions.get(retries)
+    if s is None:
+        with _lock:
+            s = _sessions.get(retries)
+            if s is None:
+                import requests
+                from requests.adapters import HTTPAdapter
+
+                s = requests.Session()
+                adapter = HTTPAdapter(pool_connections=POOL_HOSTS, pool_maxsize=POOL_PER_HOST,
+                                      max_retries=_retry() if retries else 0)
+                s.mount('https://', adapter)
+                s.mount('http://', adapter)
+                _sessions[retries] = s
+    return s
+
+
+def _timeout(timeout):
+    # A bare number is the read timeout; connecting gets its own short budget.
+    if isinstance(timeout, (int, float)):
+        return (min(CONNECT_TIMEOUT, timeout), timeout)
+    return timeout
+
+
+def get(url, timeout=10, **kwargs):
+    return session().get(url, timeout=_timeout(timeout), **kwargs)
+
+
+def post(url, timeout=90, **kwargs):
+    return session(retries=False).post(url, timeout=_timeout(timeout), **kwargs)
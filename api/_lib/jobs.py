@@ -0,0 +1,215 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from .trace import begin
+
+# ── BATCH JOBS ─────────────────────────────────────────────────────
+# A job is a list of URLs/PDFs submitted at once. Items wait in a SQLite
+# queue; workers claim them one at a time, up to BATCH_WORKERS in parallel,
+# and write each lesson back as soon as it is ready, so progress can be
+# polled or streamed per item.
+#
+# Any process that opens the same file can work the queue: the handler
+# starts worker threads in-process, and `python api/batch.py --worker` runs a
+# standalone worker next to a local server. On Vercel /tmp is per instance,
+# so there a job is only worked (and visible) on the instance that took it.
+
+JOBS_PATH = os.environ.get('BATCH_JOBS_PATH', '/tmp/german_article_jobs.sqlite')
+BATCH_WORKERS = int(os.environ.get('BATCH_WORKERS', 3))
+BATCH_MAX_ITEMS = int(os.environ.get('BATCH_MAX_ITEMS', 50))
+JOB_TTL = int(os.environ.get('BATCH_JOB_TTL', 24 * 3600))
+ITEM_TIMEOUT = 600          # a claimed item not finished by then is requeued
+MAX_ATTEMPTS = 2
+
+
+class JobStore:
+    """SQLite-backed job queue with per-item results."""
+
+    def __init__(self, path=JOBS_PATH):
+        self.path = path
+        self._local = threading.local()
+
+    def _conn(self):
+        # One connection per thread: claims take a write lock with BEGIN IMMEDIATE.
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            db.execute('PRAGMA journal_mode=WAL')
+            db.executescript(
+                'CREATE TABLE IF NOT EXISTS jobs ('
+                ' id TEXT PRIMARY KEY, created REAL NOT NULL, api_key TEXT, total INTEGER NOT NULL);'
+                'CREATE TABLE IF NOT EXISTS items ('
+                ' job_id TEXT NOT NULL, idx INTEGER NOT NULL, kind TEXT NOT NULL,'
+                ' source TEXT NOT NULL, pdf BLOB, pages TEXT,'
+                ' status TEXT NOT NULL, title TEXT, lesson TEXT, error TEXT, cache TEXT,'
+                ' attempts INTEGER NOT NULL DEFAULT 0, started REAL, finished REAL,'
+                ' PRIMARY KEY (job_id, idx));'
+                'CREATE INDEX IF NOT EXISTS items_status ON items(status);')
+            self._local.db = db
+        return db
+
+    @contextmanager
+    def _write(self):
+        db = self._conn()
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            yield db
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+        db.execute('COMMIT')
+
+    def create(self, api_key, items):
+        """Queue `items` (dicts with kind, source, and pdf/pages for PDFs); returns the job id."""
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._write() as db:
+            self._expire(db, now)
+            db.execute('INSERT INTO jobs (id, created, api_key, total) VALUES (?, ?, ?, ?)',
+                       (job_id, now, api_key, len(items)))
+            db.executemany(
+                'INSERT INTO items (job_id, idx, kind, source, pdf, pages, status) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                [(job_id, i, it['kind'], it['source'], it.get('pdf'), it.get('pages'), 'queued')
+                 for i, it in enumerate(items)])
+        return job_id
+
+    def _expire(self, db, now):
+        db.execute('DELETE FROM items WHERE job_id IN (SELECT id FROM jobs WHERE created < ?)',
+                   (now - JOB_TTL,))
+        db.execute('DELETE FROM jobs WHERE created < ?', (now - JOB_TTL,))
+
+    def claim(self):
+        """Mark the oldest queued item running; returns it as a dict, or None."""
+        now = time.time()
+        with self._write() as db:
+            db.execute("UPDATE items SET status = 'queued' WHERE status = 'running' AND started < ? "
+                       'AND attempts < ?', (now - ITEM_TIMEOUT, MAX_ATTEMPTS))
+            db.execute("UPDATE items SET status = 'error', error = 'Timed out', finished = ? "
+                       "WHERE status = 'running' AND started < ?", (now, now - ITEM_TIMEOUT))
+            row = db.execute(
+                'SELECT i.job_id, i.idx, i.kind, i.source, i.pdf, i.pages, j.api_key '
+                'FROM items i JOIN jobs j ON j.id = i.job_id '
+                "WHERE i.status = 'queued' ORDER BY j.created, i.idx LIMIT 1").fetchone()
+            if row:
+                db.execute("UPDATE items SET status = 'running', started = ?, attempts = attempts + 1 "
+                           'WHERE job_id = ? AND idx = ?', (now, row[0], row[1]))
+        if not row:
+            return None
+        keys = ('job_id', 'index', 'kind', 'source', 'pdf', 'pages', 'api_key')
+        return dict(zip(keys, row))
+
+    def finish(self, job_id, index, title=None, lesson=None, cache=None, error=None):
+        """Store an item's lesson (or error); forget the API key once the job is complete."""
+        with self._write() as db:
+            db.execute(
+                'UPDATE items SET status = ?, title = ?, lesson = ?, cache = ?, error = ?, '
+                'finished = ?, pdf = NULL WHERE job_id = ? AND idx = ?',
+                ('error' if error else 'done', title,
+                 json.dumps(lesson, ensure_ascii=False) if lesson is not None else None,
+                 cache, error, time.time(), job_id, index))
+            db.execute(
+                "UPDATE jobs SET api_key = NULL WHERE id = ? AND NOT EXISTS ("
+                "SELECT 1 FROM items WHERE job_id = ? AND status NOT IN ('done', 'error'))",
+                (job_id, job_id))
+
+    def job(self, job_id, lessons=True):
+        """Status of a job and each of its items, or None if it does not exist."""
+        db = self._conn()
+        job = db.execute('SELECT created, total FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        if not job:
+            return None
+        rows = db.execute(
+            'SELECT idx, kind, source, status, title, error, cache, started, finished'
+            + (', lesson' if lessons else '') +
+            ' FROM items WHERE job_id = ? ORDER BY idx', (job_id,)).fetchall()
+        items = []
+        counts = {'queued': 0, 'running': 0, 'done': 0, 'error': 0}
+        for row in rows:
+            idx, kind, source, status, title, error, cache, started, finished = row[:9]
+            counts[status] += 1
+            item = {'index': idx, 'kind': kind, 'source': source, 'status': status}
+            if title:
+                item['title'] = title
+            if error:
+                item['error'] = error
+            if status == 'done':
+                item['cache'] = cache
+                item['seconds'] = round(finished - started, 2)
+                if lessons:
+                    item['lesson'] = json.loads(row[9])
+            items.append(item)
+        return {
+            'job_id': job_id,
+            'created': job[0],
+            'total': job[1],
+            'counts': counts,
+            'finished': counts['done'] + counts['error'] == job[1],
+            'items': items,
+        }
+
+    def pending(self):
+        (n,) = self._conn().execute(
+            "SELECT COUNT(*) FROM items WHERE status = 'queued'").fetchone()
+        return n
+
+
+JOB_STORE = JobStore()
+
+_running = False
+_running_lock = threading.Lock()
+
+
+def work(process, store=JOB_STORE, workers=BATCH_WORKERS, deadline=None, idle_exit=True):
+    """Process queued items with up to `workers` threads.
+
+    `process(item)` returns `(title, lesson, cache_status)` or raises. With
+    `idle_exit` the workers stop once the queue is empty; otherwise they
+    keep polling for new jobs. No item is claimed after `deadline`.
+    """
+    def loop():
+        while not (deadline and time.time() > deadline):
+            item = store.claim()
+            if item is None:
+                if idle_exit:
+                    return
+                time.sleep(1.0)
+                continue
+            trace = begin('/api/batch#item')
+            trace.set(job_id=item['job_id'], item=item['index'], kind=item['kind'])
+            try:
+                title, lesson, cache = process(item)
+                store.finish(item['job_id'], item['index'], title=title, lesson=lesson, cache=cache)
+                trace.finish(200)
+            except Exception as e:
+                store.finish(item['job_id'], item['index'], error=str(e) or type(e).__name__)
+                trace.finish(500, error=e)
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        for future in [pool.submit(loop) for _ in range(max(1, workers))]:
+            future.result()
+
+
+def work_in_background(process, store=JOB_STORE):
+    """Start in-process workers for queued items unless they are already running."""
+    global _running
+    with _running_lock:
+        if _running:
+            return
+        _running = True
+
+    def run():
+        global _running
+        try:
+            work(process, store)
+        finally:
+            with _running_lock:
+                _running = False
+
+    threading.Thread(target=run, daemon=True).start()
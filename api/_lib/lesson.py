@@ -0,0 +1,231 @@
+import threading
+
+from .cache import LESSON_CACHE, lesson_key
+from .chunking import (CHUNK_THRESHOLD, CHUNKED_PROMPT_ID, finish_lesson, generate_chunked_lesson,
+                       iter_chunked_lesson, iter_patched_lesson, iter_resumed_lesson, reusable_items)
+from .groq import MODEL, chat_completion
+from .nlp import prepare, segment
+from .schema import prompt_for
+from .similar import SIMILAR_INDEX
+from .streaming import add_event, lesson_events, stream_chat
+from .trace import stage
+
+# ── LESSON GENERATION ──────────────────────────────────────────────
+# Text in, lesson out: preprocessing, the lesson cache, reuse of a
+# near-duplicate's lesson, one call or parallel chunks, continuation of a
+# cut-off answer. /api (Deutschlandfunk articles) and /api/process-custom
+# (+ /api/batch) differ only in their system prompt, so each builds one
+# LessonGenerator with its own and shares the rest.
+#
+# Streamed lessons are coalesced by lesson cache key: while one request is
+# generating a lesson, another request for the same text follows the same
+# events (status 'coalesced') instead of starting a second generation.
+# Non-streamed requests also join a lesson that is streaming. Otherwise
+# only the Groq call itself is shared (groq.chat_completion).
+
+_inflight = {}
+_inflight_lock = threading.Lock()
+
+
+class _SharedStream:
+    """The events of one lesson generation, replayed to every request that joins it."""
+
+    def __init__(self):
+        self.events = []
+        self.finished = False
+        self.error = None
+        self._cond = threading.Condition()
+
+    def lead(self, key, events):
+        """Pass `events` through, recording them for followers."""
+        # Also what followers see if the leading request goes away mid-stream.
+        error = Exception("Lesson generation was abandoned.")
+        try:
+            for event in events:
+                with self._cond:
+                    self.events.append(event)
+                    self._cond.notify_all()
+                yield event
+            error = None
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            with _inflight_lock:
+                if _inflight.get(key) is self:
+                    del _inflight[key]
+            with self._cond:
+                self.finished = True
+                self.error = error
+                self._cond.notify_all()
+
+    def follow(self):
+        """All events from the first one, as they come; raises if the generation failed."""
+        seen = 0
+        while True:
+            with self._cond:
+                while seen == len(self.events) and not self.finished:
+                    self._cond.wait()
+                new, finished, error = self.events[seen:], self.finished, self.error
+            seen += len(new)
+            yield from new
+            if finished:
+                if error is not None:
+                    raise error
+                return
+
+
+class LessonGenerator:
+    """Cached lesson generation with one entry point's system prompt."""
+
+    def __init__(self, system_prompt):
+        self.system_prompt = system_prompt
+
+    def payload(self, title, content, prepared=None):
+        user = prepared.user_text(title) if prepared else f"Title: {title}\n\nContent:\n{content}"
+        return {
+            "model": MODEL,
+            "messages": [
+                {"role": "system", "content": prompt_for(self.system_prompt, prepared)},
+                {"role": "user", "content": user}
+            ],
+            "response_format": {"type": "json_object"},
+            "temperature": 0.3,
+            "max_tokens": 16000
+        }
+
+    def generate(self, title, content, api_key, prepared=None):
+        """Raw model output for the whole text in one call."""
+        return chat_completion(self.payload(title, content, prepared), api_key)
+
+    def prompt(self, chunked, prepared):
+        """The prompt(s) a lesson for this text is generated with, for its cache key."""
+        return prompt_for(CHUNKED_PROMPT_ID if chunked else self.system_prompt, prepared)
+
+    def _lookup(self, title, content):
+        with stage('preprocess'):
+            prepared = prepare(content)
+        chunked = len(content) > CHUNK_THRESHOLD
+        key = lesson_key(title, content, self.prompt(chunked, prepared), MODEL)
+        with stage('cache'):
+            cached = LESSON_CACHE.get(key)
+        return prepared, chunked, key, cached
+
+    def _similar(self, content, prepared):
+        """`(lesson, sentences, items)` to patch from a near-duplicate's lesson, or None."""
+        with stage('similar'):
+            sentences = prepared.sentences if prepared else segment(content)
+            for other in SIMILAR_INDEX.lessons_like(content):
+                lesson = LESSON_CACHE.get(other)
+                items = reusable_items(lesson, sentences, prepared) if lesson else None
+                if items is not None:
+                    SIMILAR_INDEX.stats['reused'] += 1
+                    return lesson, sentences, items
+        return None
+
+    def _store(self, key, content, lesson):
+        with stage('cache'):
+            LESSON_CACHE.put(key, lesson)
+            SIMILAR_INDEX.add(content, lesson=key)
+
+    def cached(self, title, content, api_key):
+        """`(lesson, 'hit' | 'coalesced' | 'similar' | 'miss', key)`: cached, taken
+        from a stream generating it, patched from a near-duplicate's lesson, or
+        freshly generated; `key` is its lesson cache key."""
+        prepared, chunked, key, lesson = self._lookup(title, content)
+        if lesson is not None:
+            return lesson, 'hit', key
+        with _inflight_lock:
+            shared = _inflight.get(key)
+        if shared:
+            try:
+                with stage('coalesced'):
+                    lesson = {}
+                    for event, value in shared.follow():
+                        add_event(lesson, event, value)
+                return lesson, 'coalesced', key
+            except Exception:
+                pass    # may be the other request's API key; generate it here
+        similar = self._similar(content, prepared)
+        with stage('generate'):
+            if similar:
+                lesson = {}
+                for event, value in iter_patched_lesson(title, *similar, api_key, prepared):
+                    add_event(lesson, event, value)
+            elif chunked:
+                lesson = generate_chunked_lesson(title, content, api_key, prepared=prepared)
+            else:
+                text = self.generate(title, content, api_key, prepared)
+                lesson = finish_lesson(title, content, text, api_key, prepared)
+        self._store(key, content, lesson)
+        return lesson, 'similar' if similar else 'miss', key
+
+    def stream(self, title, content, api_key):
+        """`('hit' | 'coalesced' | 'similar' | 'miss', events, key)` for a streamed lesson.
+
+        The cache is checked before this returns, so the status can go out
+        first; anything not cached is generated as `events` is iterated and
+        cached once it has run to the end. If the same lesson is already
+        being generated, `events` follows that generation instead.
+        """
+        prepared, chunked, key, lesson = self._lookup(title, content)
+        if lesson is not None:
+            return 'hit', lesson_events(lesson), key
+
+        def generate():
+            similar = self._similar(content, prepared)
+            if similar:
+                events = iter_patched_lesson(title, *similar, api_key, prepared)
+                return 'similar', self._storing(events, key, content)
+            return 'miss', self._generate_events(title, content, api_key, prepared, chunked, key)
+
+        with _inflight_lock:
+            shared = _inflight.get(key)
+        if shared:
+            return 'coalesced', self._following(shared, lambda: generate()[1]), key
+        status, events = generate()
+        return status, self._leading(key, events), key
+
+    def _leading(self, key, events):
+        # Registered on the first event rather than in stream(), so that a
+        # stream the handler never starts cannot leave followers waiting.
+        with _inflight_lock:
+            shared = _inflight.get(key)
+            if shared is None:
+                shared = _inflight[key] = _SharedStream()
+                leader = True
+            else:
+                leader = False
+        if leader:
+            yield from shared.lead(key, events)
+        else:
+            yield from self._following(shared, lambda: events)
+
+    def _following(self, shared, fallback):
+        """`shared`'s events. Should it fail before sending any, generate the
+        lesson here instead (`fallback()`): the failure may be the other
+        request's API key."""
+        started = False
+        try:
+            for event in shared.follow():
+                started = True
+                yield event
+        except Exception:
+            if started:
+                raise
+            yield from fallback()
+
+    def _generate_events(self, title, content, api_key, prepared, chunked, key):
+        if chunked:
+            events = iter_chunked_lesson(title, content, api_key, prepared=prepared)
+        else:
+            deltas = stream_chat(self.payload(title, content, prepared), api_key)
+            events = iter_resumed_lesson(title, content, deltas, api_key, prepared)
+        yield from self._storing(events, key, content)
+
+    def _storing(self, events, key, content):
+        lesson = {}
+        for event, value in events:
+            add_event(lesson, event, value)
+            yield event, value
+        self._store(key, content, lesson)
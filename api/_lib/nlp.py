@@ -0,0 +1,207 @@
+import mmap
+import os
+import re
+import threading
+
+# ── LOCAL GERMAN PREPROCESSING ─────────────────────────────────────
+# Sentence splitting, numbering and tokenizing are deterministic, so they
+# are done here instead of being paid for in output tokens. The model gets
+# the text as numbered sentences plus the list of words the bundled
+# lexicon already translates, and only writes translations, new word
+# meanings and notes; the server fills in the German sentences and the
+# known meanings when it expands the lesson (see schema.py).
+#
+# The lexicon is a sorted `word<TAB>meaning` file that is memory-mapped
+# and binary-searched, so a cold start neither reads nor parses all of it.
+
+LEXICON_PATH = os.environ.get(
+    'LEXICON_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'lexicon_de_en.tsv'))
+# Needs the compact schema: v1 items have no way to leave the sentence out.
+PREPROCESS = (os.environ.get('LESSON_PREPROCESS', '1') != '0'
+              and os.environ.get('LESSON_SCHEMA', 'v2') != 'v1')
+MIN_GERMAN_SHARE = 0.12     # share of tokens that must be German function words
+
+_ABBREVIATIONS = ('z.B.', 'u.a.', 'd.h.', 'bzw.', 'ca.', 'Dr.', 'Nr.', 'Prof.', 'St.',
+                  'usw.', 'etc.', 'vgl.', 'Mio.', 'Mrd.', 'Jh.', 'evtl.', 'ggf.', 'inkl.')
+_SENTENCE_END = re.compile(r'([.!?…]["»«“”\')]*)\s+(?=["»«„“(]?[A-ZÄÖÜ0-9])')
+_ORDINAL = re.compile(r'\d{1,2}\.')
+# One letter and a period: spaced abbreviations (z. B., d. h., u. a., S. 5)
+# and initials (Angela M. Merkel).
+_INITIAL = re.compile(r'[A-Za-zÄÖÜäöü]\.')
+_PARAGRAPH = re.compile(r'\n\s*\n')
+_SPACE = re.compile(r'\s+')
+_WORD = re.compile(r"[0-9A-Za-zÄÖÜäöüßÀ-ÿ]+(?:[-'’][0-9A-Za-zÄÖÜäöüßÀ-ÿ]+)*")
+
+_GERMAN_MARKERS = frozenset((
+    'der', 'die', 'das', 'und', 'ist', 'nicht', 'ein', 'eine', 'zu', 'den', 'mit', 'von',
+    'sich', 'auf', 'für', 'im', 'dem', 'des', 'auch', 'es', 'sind', 'wird', 'werden', 'hat',
+))
+
+
+def split_sentences(text):
+    """Split on sentence punctuation, skipping common abbreviations, initials and ordinals."""
+    sentences = []
+    start = 0
+    for m in _SENTENCE_END.finditer(text):
+        candidate = text[start:m.end(1)]
+        last = candidate.rsplit(None, 1)[-1]
+        if last.endswith(_ABBREVIATIONS) or _ORDINAL.fullmatch(last) or _INITIAL.fullmatch(last):
+            continue
+        if candidate:
+            sentences.append(candidate.strip())
+        start = m.end()
+    tail = text[start:].strip()
+    if tail:
+        sentences.append(tail)
+    return sentences
+
+
+def segment(text):
+    """All sentences of `text`, paragraph by paragraph, whitespace normalized."""
+    sentences = []
+    for para in _PARAGRAPH.split(text or ''):
+        sentences += split_sentences(_SPACE.sub(' ', para).strip())
+    return sentences
+
+
+def tokenize(sentence):
+    """Word tokens of a sentence, punctuation stripped, in order."""
+    return _WORD.findall(sentence or '')
+
+
+def looks_german(tokens):
+    if not tokens:
+        return False
+    hits = sum(1 for t in tokens if t.lower() in _GERMAN_MARKERS)
+    return hits / len(tokens) >= MIN_GERMAN_SHARE
+
+
+# ── LEXICON ────────────────────────────────────────────────────────
+
+def _key(word):
+    return word.casefold().encode('utf-8')
+
+
+class Lexicon:
+    """Read-only German→English word list, looked up in place via mmap."""
+
+    def __init__(self, path=LEXICON_PATH):
+        self.path = path
+        self._mm = None
+        self._start = 0
+        self._lock = threading.Lock()
+
+    def _map(self):
+        if self._mm is None:
+            with self._lock:
+                if self._mm is None:
+                    with open(self.path, 'rb') as f:
+                        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                    start = 0
+                    while mm[start:start + 1] == b'#':     # header comment lines
+                        start = mm.find(b'\n', start) + 1
+                    self._start = start
+                    self._mm = mm
+        return self._mm
+
+    def lookup(self, word):
+        """English meaning of `word` (case-insensitive), or None."""
+        try:
+            mm = self._map()
+        except OSError:
+            return None
+        key = _key(word)
+        lo, hi = self._start, len(mm)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            start = max(mm.rfind(b'\n', lo, mid) + 1, lo)
+            end = mm.find(b'\n', start)
+            if end == -1:
+                end = len(mm)
+            tab = mm.find(b'\t', start, end)
+            found = mm[start:tab]
+            if found == key:
+                return mm[tab + 1:end].decode('utf-8')
+            if found < key:
+                lo = end + 1
+            else:
+                hi = start
+        return None
+
+
+def write_lexicon(pairs, path=LEXICON_PATH, header=()):
+    """Write `(word, meaning)` pairs in the sorted layout Lexicon expects."""
+    merged = {}
+    for word, meaning in pairs:
+        senses = merged.setdefault(_key(word), [])
+        senses += [s for s in meaning.split('; ') if s not in senses]
+    with open(path, 'wb') as f:
+        for line in header:
+            f.write(f'# {line}\n'.encode('utf-8'))
+        for key in sorted(merged):
+            f.write(key + b'\t' + '; '.join(merged[key]).encode('utf-8') + b'\n')
+
+
+LEXICON = Lexicon()
+
+
+# ── PREPARED TEXT ──────────────────────────────────────────────────
+
+class Prepared:
+    """A text split into sentences, with the lexicon meanings of its words."""
+
+    def __init__(self, sentences, known):
+        self.sentences = sentences
+        self.known = known
+
+    def user_text(self, title, label='Sentences'):
+        numbered = '\n'.join(f'{i}. {s}' for i, s in enumerate(self.sentences, 1))
+        text = f"Title: {title}\n\n{label}:\n{numbered}"
+        if self.known:
+            text += f"\n\nKnown words: {', '.join(self.known)}"
+        return text
+
+    def after(self, count):
+        """The sentences after the first `count`, as their own Prepared."""
+        return _prepare(self.sentences[count:])
+
+    def select(self, sentences):
+        """Some of these sentences, in the given order, as their own Prepared."""
+        return _prepare(list(sentences))
+
+    def chunks(self, max_chars):
+        """Consecutive runs of about `max_chars`, each with only its own known words."""
+        groups, current, size = [], [], 0
+        for sentence in self.sentences:
+            if current and size + len(sentence) + 1 > max_chars:
+                groups.append(current)
+                current, size = [], 0
+            current.append(sentence)
+            size += len(sentence) + 1
+        if current:
+            groups.append(current)
+        return [_prepare(group) for group in groups]
+
+
+def _prepare(sentences):
+    known, seen = {}, set()
+    for sentence in sentences:
+        for token in tokenize(sentence):
+            folded = token.casefold()
+            if folded not in seen:
+                seen.add(folded)
+                meaning = LEXICON.lookup(token)
+                if meaning:
+                    known[token] = meaning
+    return Prepared(sentences, known)
+
+
+def prepare(text):
+    """Prepared text, or None when preprocessing is off or the text is not German."""
+    if not PREPROCESS:
+        return None
+    sentences = segment(text)
+    tokens = [t for s in sentences[:40] for t in tokenize(s)]
+    if len(sentences) < 2 or not looks_german(tokens):
+        return None
+    return _prepare(sentences)
@@ -0,0 +1,179 @@
+import json
+import math
+import os
+import random
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .feeds import FEED_INDEX
+from .similar import SIMILAR_INDEX
+
+# ── PRE-GENERATED LESSON POOL ──────────────────────────────────────
+# /api only needs "a random current article", so lessons can be made ahead
+# of time. A warmer (cron GET /api?warm=1, or a background refill after each
+# pop) generates lessons from fresh feed items with the server's own
+# GROQ_API_KEY and the handler pops one instantly. The pool is balanced
+# across the RSS feeds and entries expire after POOL_TTL. Near-duplicates
+# of articles served lately are not pooled, and a pooled one that has
+# become a duplicate since (the same story served from another feed) is
+# dropped when popped.
+
+POOL_PATH = os.environ.get('LESSON_POOL_PATH', '/tmp/german_article_pool.sqlite')
+POOL_SIZE = int(os.environ.get('LESSON_POOL_SIZE', 16))
+POOL_TTL = int(os.environ.get('LESSON_POOL_TTL', 3 * 3600))
+POOL_WORKERS = int(os.environ.get('LESSON_POOL_WORKERS', 2))
+POOL_API_KEY = os.environ.get('GROQ_API_KEY', '')
+SERVED_TTL = 24 * 3600      # don't pre-generate an article that was just served
+
+
+class LessonPool:
+    """SQLite-backed pool of ready lessons, balanced per feed."""
+
+    def __init__(self, path=POOL_PATH, size=POOL_SIZE, ttl=POOL_TTL, feeds=None):
+        self.path = path
+        self.size = size
+        self.ttl = ttl
+        self.feeds = list(feeds or FEED_INDEX.feeds)
+        self._lock = threading.Lock()
+        self._refilling = False
+        self._db = None
+
+    def _conn(self):
+        if self._db is None:
+            try:
+                self._db = sqlite3.connect(self.path, timeout=5, check_same_thread=False)
+                self._db.executescript(
+                    'CREATE TABLE IF NOT EXISTS pool ('
+                    ' url TEXT PRIMARY KEY, feed TEXT NOT NULL, lesson TEXT NOT NULL, created REAL NOT NULL);'
+                    'CREATE TABLE IF NOT EXISTS served (url TEXT PRIMARY KEY, at REAL NOT NULL);')
+            except sqlite3.Error:
+                # Read-only filesystem or similar: no pool, every lesson is made on demand.
+                self._db = False
+        return self._db or None
+
+    def _expire(self, db, now):
+        db.execute('DELETE FROM pool WHERE created < ?', (now - self.ttl,))
+        db.execute('DELETE FROM served WHERE at < ?', (now - SERVED_TTL,))
+
+    def counts(self):
+        """Fresh lessons per feed."""
+        rows = {}
+        with self._lock:
+            db = self._conn()
+            if db:
+                try:
+                    self._expire(db, time.time())
+                    db.commit()
+                    rows = dict(db.execute('SELECT feed, COUNT(*) FROM pool GROUP BY feed').fetchall())
+                except sqlite3.Error:
+                    db.rollback()
+        return {feed: rows.get(feed, 0) for feed in self.feeds}
+
+    def pop(self):
+        """Take one fresh lesson, choosing a feed uniformly; `(url, lesson)` or None."""
+        now = time.time()
+        with self._lock:
+            db = self._conn()
+            if not db:
+                return None
+            try:
+                self._expire(db, now)
+                while True:
+                    feeds = [f for (f,) in db.execute('SELECT DISTINCT feed FROM pool')]
+                    if not feeds:
+                        db.commit()
+                        return None
+                    feed = random.choice(feeds)
+                    url, lesson = db.execute(
+                        'SELECT url, lesson FROM pool WHERE feed = ? ORDER BY created LIMIT 1',
+                        (feed,)).fetchone()
+                    db.execute('DELETE FROM pool WHERE url = ?', (url,))
+                    db.execute('INSERT OR REPLACE INTO served (url, at) VALUES (?, ?)', (url, now))
+                    if not SIMILAR_INDEX.served_recently(url=url):
+                        break
+                    SIMILAR_INDEX.stats['skipped'] += 1
+                db.commit()
+            except sqlite3.Error:
+                db.rollback()
+                return None
+        SIMILAR_INDEX.mark_served(url)
+        return url, json.loads(lesson)
+
+    def _candidates(self):
+        """Fresh article links per feed, enough to cover each feed's deficit.
+
+        Feeds share articles; each URL is a candidate for one feed only.
+        """
+        counts = self.counts()
+        per_feed = math.ceil(self.size / max(len(self.feeds), 1))
+        with self._lock:
+            db = self._conn()
+            taken = {u for (u,) in db.execute('SELECT url FROM pool UNION SELECT url FROM served')}
+        jobs = []
+        for feed in self.feeds:
+            deficit = per_feed - counts.get(feed, 0)
+            if deficit <= 0:
+                continue
+            links = [u for u in FEED_INDEX.links(feed)
+                     if u not in taken and not SIMILAR_INDEX.served_recently(url=u)]
+            picked = random.sample(links, min(deficit, len(links)))
+            taken.update(picked)
+            jobs += [(feed, url) for url in picked]
+        return jobs
+
+    def refill(self, build, deadline=None):
+        """Generate lessons until every feed has its share; returns how many were added.
+
+        `build(url)` returns a lesson dict (or None to skip the article).
+        Work stops being started once `deadline` (a time.time() value) passes.
+        """
+        with self._lock:
+            if not self._conn():
+                return 0
+        FEED_INDEX.refresh_if_stale()
+        jobs = self._candidates()
+        added = 0
+
+        def make(job):
+            feed, url = job
+            if deadline and time.time() > deadline:
+                return None
+            try:
+                lesson = build(url)
+            except Exception:
+                return None
+            return (feed, url, lesson) if lesson else None
+
+        with ThreadPoolExecutor(max_workers=max(1, POOL_WORKERS)) as workers:
+            for made in workers.map(make, jobs):
+                if not made:
+                    continue
+                feed, url, lesson = made
+                with self._lock:
+                    db = self._conn()
+                    cur = db.execute('INSERT OR IGNORE INTO pool (url, feed, lesson, created) VALUES (?, ?, ?, ?)',
+                                     (url, feed, json.dumps(lesson, ensure_ascii=False), time.time()))
+                    db.commit()
+                added += cur.rowcount
+        return added
+
+    def refill_in_background(self, build):
+        """Start a refill thread unless one is already running."""
+        with self._lock:
+            if self._refilling:
+                return
+            self._refilling = True
+
+        def run():
+            try:
+                self.refill(build)
+            finally:
+                with self._lock:
+                    self._refilling = False
+
+        threading.Thread(target=run, daemon=True).start()
+
+
+LESSON_POOL = LessonPool()
@@ -0,0 +1,98 @@
+import os
+import re
+
+from .nlp import tokenize
+
+# ── COMPACT LESSON SCHEMA (v2) ─────────────────────────────────────
+# v1 asks the model for word_meanings covering every word of every
+# sentence, so "der", "und" or "Regierung" are translated again in each
+# sentence that uses them. In v2 each sentence only carries the words that
+# are new to the article ("new"); together they form one article-level
+# glossary, written incrementally so sentences can still be streamed.
+# The server rebuilds each sentence's word_meanings from the glossary
+# by tokenizing the sentence, so index.html keeps getting the v1 shape.
+#
+# When nlp.prepare() has already split the text, the model is sent numbered
+# sentences and the lexicon's known words: it leaves out "de" and the known
+# words, and the expander fills both back in.
+
+LESSON_SCHEMA = os.environ.get('LESSON_SCHEMA', 'v2')
+
+V2_KEYS = {'n': 'sentence_number', 'de': 'german_sentence', 'en': 'english_translation',
+           'note': 'grammar_notes'}
+
+_STRIP = re.compile(r"^[^\wÄÖÜäöüß]+|[^\wÄÖÜäöüß]+$")
+_DE_SKELETON = re.compile(r'^\s*"de": "German sentence\.",\n', re.M)
+
+PREPARED_RULES = """
+- The text is already split into numbered sentences: write exactly one item per sentence, with "n" set to its number, and leave out "de"
+- Words listed under "Known words" are already translated: leave them out of "new" unless the sentence uses them in another meaning"""
+
+
+def prompt_for(prompt, prepared):
+    """`prompt` as sent for a text nlp.prepare() returned `prepared` for."""
+    if prepared is None:
+        return prompt
+    return _DE_SKELETON.sub('', prompt) + PREPARED_RULES
+
+
+class GlossaryExpander:
+    """Turns v2 sentence items back into v1 ones, one article at a time."""
+
+    def __init__(self, prepared=None):
+        self.glossary = {}
+        self._folded = {}
+        self._sentences = prepared.sentences if prepared else []
+        if prepared:
+            self._learn(prepared.known)
+
+    def _learn(self, new):
+        for word, meaning in (new or {}).items():
+            word = _STRIP.sub('', str(word))
+            if word and meaning:
+                self.glossary[word] = meaning
+                self._folded[word.casefold()] = meaning
+
+    def _meaning(self, word):
+        if word in self.glossary:
+            return self.glossary[word]
+        return self._folded.get(word.casefold())
+
+    def item(self, obj):
+        """v1 item for `obj`; v1 items pass through untouched."""
+        if not isinstance(obj, dict) or 'german_sentence' in obj or not ('de' in obj or 'n' in obj):
+            return obj
+        self._learn(obj.get('new'))
+        item = {v1: obj.get(v2, '') for v2, v1 in V2_KEYS.items()}
+        number = obj.get('n')
+        if 'de' not in obj and isinstance(number, int) and 0 < number <= len(self._sentences):
+            item['german_sentence'] = self._sentences[number - 1]
+        meanings = {}
+        for word in tokenize(item['german_sentence']):
+            meaning = self._meaning(word)
+            if meaning and word not in meanings:
+                meanings[word] = meaning
+        item['word_meanings'] = meanings
+        return {k: item[k] for k in ('sentence_number', 'german_sentence', 'english_translation',
+                                     'word_meanings', 'grammar_notes')}
+
+
+def expand_lesson(lesson, prepared=None):
+    """A parsed v1 or v2 lesson in the v1 shape index.html renders."""
+    content = lesson.get('content')
+    if not isinstance(content, list):
+        return lesson
+    expander = GlossaryExpander(prepared)
+    return {**lesson, 'content': [expander.item(obj) for obj in content]}
+
+
+def expand_events(events, prepared=None):
+    """Stream version of expand_lesson for `(event, value)` pairs."""
+    expander = GlossaryExpander(prepared)
+    for event, value in events:
+        yield event, expander.item(value) if event == 'sentence' else value
+
+
+def pick(v1_prompt, v2_prompt):
+    """The system prompt for the configured LESSON_SCHEMA."""
+    return v1_prompt if LESSON_SCHEMA == 'v1' else v2_prompt
@@ -0,0 +1,241 @@
+import hashlib
+import os
+import random
+import sqlite3
+import struct
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+from .nlp import tokenize
+
+# ── NEAR-DUPLICATE ARTICLES ────────────────────────────────────────
+# The same agency story runs in several feeds and on other German sites
+# under different URLs and with small edits, so exact lesson-cache keys
+# never match. Each article's word shingles are summarised as a MinHash
+# signature and indexed with LSH banding. Two texts whose signatures agree
+# in at least SIMILAR_THRESHOLD of their positions (an estimate of the
+# Jaccard similarity of their shingle sets) count as the same story:
+#
+# - a new text reuses the lesson of its near-duplicate, with only the
+#   sentences it does not share generated (see LessonGenerator);
+# - /api skips a random article that duplicates another one served within
+#   SIMILAR_SERVED_TTL, without scraping it if the URL is already indexed;
+#   the lesson pool skips them when it fills up and again when it pops.
+#
+# An identical text (the same copy under another URL or headline) is the
+# closest match of all. Texts are stored once per content key; the URLs
+# they were found under, and when each was served, are kept per URL.
+#
+# Stdlib only: signatures are universal hashes of 64-bit blake2b shingle
+# hashes, kept with their LSH buckets in SQLite in /tmp.
+
+INDEX_PATH = os.environ.get('SIMILAR_INDEX_PATH', '/tmp/german_article_similar.sqlite')
+# About one edited sentence in ten. Lesson reuse is safe even below this:
+# only sentences that match exactly are taken over (chunking.reusable_items).
+SIMILAR_THRESHOLD = float(os.environ.get('SIMILAR_THRESHOLD', 0.7))
+SIMILAR_TTL = int(os.environ.get('SIMILAR_TTL', 7 * 24 * 3600))
+SIMILAR_SERVED_TTL = int(os.environ.get('SIMILAR_SERVED_TTL', 6 * 3600))
+SIMILAR_MAX_ROWS = int(os.environ.get('SIMILAR_MAX_ROWS', 5000))
+
+SHINGLE_WORDS = 3
+BANDS = 16
+ROWS = 4                    # BANDS x ROWS hashes per signature
+_PRIME = (1 << 61) - 1
+_rng = random.Random(20240601)  # fixed: signatures must agree across processes
+_PERMUTATIONS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(BANDS * ROWS)]
+_PACK = struct.Struct(f'<{BANDS * ROWS}Q')
+_MEMORY_ROWS = 64
+
+
+def _hash64(data):
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), 'little')
+
+
+def content_key(text):
+    """Identity of one exact text (NFC, case and whitespace folded)."""
+    words = tokenize(unicodedata.normalize('NFC', text or '').casefold())
+    return hashlib.sha256(' '.join(words).encode('utf-8')).hexdigest()
+
+
+def signature(text):
+    """MinHash signature of the text's word shingles; a tuple of BANDS*ROWS ints."""
+    words = [w.casefold() for w in tokenize(unicodedata.normalize('NFC', text or ''))]
+    n = SHINGLE_WORDS if len(words) >= SHINGLE_WORDS else max(len(words), 1)
+    hashes = {_hash64(' '.join(words[i:i + n]).encode('utf-8'))
+              for i in range(max(len(words) - n + 1, 1))}
+    return tuple(min((a * h + b) % _PRIME for h in hashes) for a, b in _PERMUTATIONS)
+
+
+def similarity(sig_a, sig_b):
+    """Estimated Jaccard similarity: the share of matching signature positions."""
+    return sum(1 for x, y in zip(sig_a, sig_b) if x == y) / len(sig_a)
+
+
+def _buckets(sig):
+    # One bucket per band, as a signed 64-bit int for SQLite.
+    packed = _PACK.pack(*sig)
+    size = ROWS * 8
+    return [(band, _hash64(packed[band * size:(band + 1) * size]) - (1 << 63)) for band in range(BANDS)]
+
+
+class SimilarityIndex:
+    """MinHash/LSH index of processed articles, their URLs and lesson keys."""
+
+    def __init__(self, path=INDEX_PATH, threshold=SIMILAR_THRESHOLD, ttl=SIMILAR_TTL,
+                 served_ttl=SIMILAR_SERVED_TTL, max_rows=SIMILAR_MAX_ROWS):
+        self.path = path
+        self.threshold = threshold
+        self.ttl = ttl
+        self.served_ttl = served_ttl
+        self.max_rows = max_rows
+        self.stats = {'reused': 0, 'skipped': 0}
+        self._signatures = OrderedDict()        # content key -> signature, per process
+        self._lock = threading.Lock()
+        self._db = None
+
+    def _conn(self):
+        if self._db is None:
+            try:
+                self._db = sqlite3.connect(self.path, timeout=5, check_same_thread=False)
+                self._db.executescript(
+                    'CREATE TABLE IF NOT EXISTS docs ('
+                    ' key TEXT PRIMARY KEY, sig BLOB NOT NULL, lesson TEXT, created REAL NOT NULL);'
+                    'CREATE TABLE IF NOT EXISTS urls ('
+                    ' url TEXT PRIMARY KEY, key TEXT NOT NULL, served REAL);'
+                    'CREATE INDEX IF NOT EXISTS urls_key ON urls(key);'
+                    'CREATE TABLE IF NOT EXISTS bands ('
+                    ' band INTEGER NOT NULL, bucket INTEGER NOT NULL, key TEXT NOT NULL,'
+                    ' PRIMARY KEY (band, bucket, key));'
+                    'CREATE INDEX IF NOT EXISTS bands_key ON bands(key);')
+                self._db.commit()
+            except sqlite3.Error:
+                # Read-only filesystem or similar: no near-duplicate detection.
+                self._db = False
+        return self._db or None
+
+    def _signature(self, key, text):
+        sig = self._signatures.get(key)
+        if sig is None:
+            sig = signature(text)
+            with self._lock:
+                self._signatures[key] = sig
+                while len(self._signatures) > _MEMORY_ROWS:
+                    self._signatures.popitem(last=False)
+        return sig
+
+    def add(self, text, url=None, lesson=None, served=False):
+        """Index `text`, recording its URL, lesson cache key and/or that it was served."""
+        key = content_key(text)
+        sig = self._signature(key, text)
+        now = time.time()
+        with self._lock:
+            db = self._conn()
+            if not db:
+                return
+            try:
+                if db.execute('SELECT 1 FROM docs WHERE key = ?', (key,)).fetchone() is None:
+                    db.execute('INSERT INTO docs (key, sig, created) VALUES (?, ?, ?)',
+                               (key, _PACK.pack(*sig), now))
+                    db.executemany('INSERT OR IGNORE INTO bands (band, bucket, key) VALUES (?, ?, ?)',
+                                   [(band, bucket, key) for band, bucket in _buckets(sig)])
+                if url:
+                    # One row per URL: the same text can be up under several.
+                    db.execute('INSERT INTO urls (url, key, served) VALUES (?, ?, ?) '
+                               'ON CONFLICT(url) DO UPDATE SET key = excluded.key, '
+                               'served = COALESCE(excluded.served, served)',
+                               (url, key, now if served else None))
+                if lesson:
+                    db.execute('UPDATE docs SET lesson = ? WHERE key = ?', (lesson, key))
+                self._evict(db, now)
+                db.commit()
+            except sqlite3.Error:
+                db.rollback()
+
+    def mark_served(self, url):
+        """Record that the article indexed under `url` was just served."""
+        with self._lock:
+            db = self._conn()
+            if not db:
+                return
+            try:
+                db.execute('UPDATE urls SET served = ? WHERE url = ?', (time.time(), url))
+                db.commit()
+            except sqlite3.Error:
+                db.rollback()
+
+    def _matches(self, db, key, sig):
+        """Content keys of indexed texts within SIMILAR_THRESHOLD of `sig`, most similar
+        first; the identical text itself (`key`), if indexed, comes first."""
+        found = set()
+        for band, bucket in _buckets(sig):
+            found.update(k for (k,) in db.execute(
+                'SELECT key FROM bands WHERE band = ? AND bucket = ?', (band, bucket)))
+        matches = []
+        for k in found:
+            row = db.execute('SELECT sig FROM docs WHERE key = ?', (k,)).fetchone()
+            if row:
+                score = 1.0 if k == key else similarity(sig, _PACK.unpack(row[0]))
+                if score >= self.threshold:
+                    matches.append((score, k == key, k))
+        return [k for _, _, k in sorted(matches, reverse=True)]
+
+    def lessons_like(self, text):
+        """Lesson cache keys of near-duplicates of `text`, most similar first."""
+        key = content_key(text)
+        sig = self._signature(key, text)
+        with self._lock:
+            db = self._conn()
+            if not db:
+                return []
+            try:
+                lessons = []
+                for k in self._matches(db, key, sig):
+                    row = db.execute('SELECT lesson FROM docs WHERE key = ? AND lesson IS NOT NULL '
+                                     'AND created >= ?', (k, time.time() - self.ttl)).fetchone()
+                    if row:
+                        lessons.append(row[0])
+            except sqlite3.Error:
+                return []
+        return lessons
+
+    def served_recently(self, text=None, url=None):
+        """Whether a near-duplicate of this article (by text, or by an indexed URL)
+        was served within SIMILAR_SERVED_TTL under a different URL."""
+        if text is not None:
+            key = content_key(text)
+            sig = self._signature(key, text)
+        with self._lock:
+            db = self._conn()
+            if not db:
+                return False
+            try:
+                if text is None:
+                    row = db.execute('SELECT docs.key, docs.sig FROM urls JOIN docs USING (key) '
+                                     'WHERE urls.url = ?', (url,)).fetchone()
+                    if not row:
+                        return False
+                    key, sig = row[0], _PACK.unpack(row[1])
+                since = time.time() - self.served_ttl
+                for k in self._matches(db, key, sig):
+                    if db.execute('SELECT 1 FROM urls WHERE key = ? AND served >= ? AND url != ?',
+                                  (k, since, url or '')).fetchone():
+                        return True
+            except sqlite3.Error:
+                return False
+        return False
+
+    def _evict(self, db, now):
+        evicted = db.execute('DELETE FROM docs WHERE created < ?', (now - self.ttl,)).rowcount
+        (count,) = db.execute('SELECT COUNT(*) FROM docs').fetchone()
+        if count > self.max_rows:
+            evicted += db.execute('DELETE FROM docs WHERE key IN '
+                                  '(SELECT key FROM docs ORDER BY created ASC LIMIT ?)',
+                                  (count - self.max_rows,)).rowcount
+        if evicted > 0:
+            db.execute('DELETE FROM bands WHERE key NOT IN (SELECT key FROM docs)')
+            db.execute('DELETE FROM urls WHERE key NOT IN (SELECT key FROM docs)')
+
+
+SIMILAR_INDEX = SimilarityIndex()
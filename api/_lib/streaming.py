@@ -0,0 +1,195 @@
+import json
+
+from . import groq
+from .trace import add_usage, stage
+
+# ── STREAMED LESSON GENERATION ─────────────────────────────────────
+# Groq streams the lesson JSON token by token. LessonStreamParser walks the
+# text as it arrives and hands back each top-level field, and each object of
+# the "content" array, as soon as it is complete, so the handler can forward
+# sentences to the browser long before the quiz has been written.
+
+
+def iter_chat_deltas(response):
+    """Yield the text deltas of an OpenAI-compatible `stream: true` response."""
+    for line in response.iter_lines(decode_unicode=True):
+        if not line or not line.startswith('data:'):
+            continue
+        data = line[5:].strip()
+        if data == '[DONE]':
+            break
+        chunk = json.loads(data)
+        if chunk.get('error'):
+            raise Exception(f"groq_error: {chunk['error'].get('message', '')[:200]}")
+        # Groq puts usage on the last chunk under x_groq; OpenAI under usage.
+        add_usage(chunk.get('usage') or (chunk.get('x_groq') or {}).get('usage'))
+        choices = chunk.get('choices') or []
+        if choices:
+            delta = choices[0].get('delta', {}).get('content')
+            if delta:
+                yield delta
+
+
+def stream_chat(payload, api_key, url=None):
+    """POST a chat completion with `stream: true` and yield its text deltas."""
+    payload = dict(payload, stream=True)
+    # Groq does not support JSON mode together with streaming; the system
+    # prompt already insists on a bare JSON object.
+    payload.pop('response_format', None)
+    with stage('groq_connect'):
+        r = groq.send(payload, api_key, url, timeout=90, stream=True)
+
+    chars = 0
+    try:
+        for delta in iter_chat_deltas(r):
+            chars += len(delta)
+            yield delta
+    finally:
+        r.close()
+        groq.budget_for(api_key).charge(chars // groq.CHARS_PER_TOKEN)
+
+
+class LessonStreamParser:
+    """Incremental parser for the lesson JSON object.
+
+    `feed()` returns a list of `(event, value)` pairs: `('sentence', obj)` for
+    every finished item of "content", and `(key, value)` for every other
+    finished top-level field. Text outside the top-level object (markdown
+    fences, chatter) is ignored.
+    """
+
+    def __init__(self):
+        self.text = ''
+        self.fields = {}
+        self.sentences = []
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._key = None
+        self._key_start = None
+        self._value_start = None
+        self._item_start = None
+        self._closed = False
+
+    def feed(self, chunk):
+        self.text += chunk
+        events = []
+        text = self.text
+        for i in range(self._pos, len(text)):
+            c = text[i]
+            if self._closed:
+                break
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif c == '\\':
+                    self._escape = True
+                elif c == '"':
+                    self._in_string = False
+                    if self._key_start is not None:
+                        self._key = json.loads(text[self._key_start:i + 1])
+                        self._key_start = None
+                continue
+            if self._depth == 0 and c != '{':
+                continue
+            if c == '"':
+                self._in_string = True
+                if self._depth == 1 and self._value_start is None:
+                    self._key_start = i
+            elif c == ':' and self._depth == 1:
+                self._value_start = i + 1
+            elif c == ',' and self._depth == 1:
+                self._finish_value(i, events)
+            elif c in '{[':
+                self._depth += 1
+                if c == '{' and self._depth == 3 and self._key == 'content':
+                    self._item_start = i
+            elif c in '}]':
+                if self._depth == 3 and c == '}' and self._item_start is not None:
+                    self._finish_item(i, events)
+                if self._depth == 1:
+                    self._finish_value(i, events)
+                    self._closed = True
+                self._depth -= 1
+        self._pos = len(text)
+        return events
+
+    def _finish_item(self, end, events):
+        try:
+            item = json.loads(self.text[self._item_start:end + 1])
+        except ValueError:
+            item = None
+        self._item_start = None
+        if isinstance(item, dict):
+            self.sentences.append(item)
+            events.append(('sentence', item))
+
+    def _finish_value(self, end, events):
+        if self._value_start is None:
+            return
+        raw = self.text[self._value_start:end].strip()
+        key, self._key, self._value_start = self._key, None, None
+        if key == 'content':
+            self.fields['content'] = None  # keeps the key's position
+            return
+        if not raw:
+            return
+        try:
+            value = json.loads(raw)
+        except ValueError:
+            return
+        self.fields[key] = value
+        events.append((key, value))
+
+    @property
+    def complete(self):
+        return self._closed
+
+    def lesson(self):
+        """Everything parsed so far, in the shape of a full lesson dict."""
+        lesson = dict(self.fields)
+        lesson['content'] = list(self.sentences)
+        return lesson
+
+
+def parse_lesson(text):
+    """`(lesson, complete)` for a whole response, salvaging a cut-off one.
+
+    A truncated response still yields every finished field and sentence.
+    """
+    try:
+        lesson = json.loads(text)
+        if isinstance(lesson, dict):
+            return lesson, True
+    except ValueError:
+        pass
+    parser = LessonStreamParser()
+    parser.feed(text)
+    lesson = parser.lesson()
+    if not parser.sentences and 'content' not in parser.fields:
+        del lesson['content']
+    return lesson, parser.complete
+
+
+def add_event(lesson, event, value):
+    """Fold one lesson event back into a lesson dict."""
+    if event == 'sentence':
+        lesson.setdefault('content', []).append(value)
+    else:
+        lesson[event] = value
+
+
+def lesson_events(lesson):
+    """Replay a finished lesson dict as the events a live stream would emit."""
+    for key, value in lesson.items():
+        if key != 'content':
+            yield key, value
+            continue
+        for item in value or []:
+            yield 'sentence', item
+
+
+def sse_event(event, data):
+    payload = json.dumps(data, ensure_ascii=False, separators=(',', ':'))
+    return f"event: {event}\ndata: {payload}\n\n".encode('utf-8')
@@ -0,0 +1,206 @@
+import contextvars
+import json
+import os
+import random
+import sys
+import threading
+import time
+import traceback
+from collections import Counter
+from contextlib import contextmanager
+
+# ── REQUEST TRACING ────────────────────────────────────────────────
+# One Trace per request times each stage (rss, scrape, pdf, groq, parse…),
+# adds up Groq token usage and records which stage raised. The handler sends
+# the timings as a Server-Timing header and ends the request with one JSON
+# log line on stdout, which Vercel keeps with the function logs.
+#
+# The active trace lives in a context variable, so library code can call
+# `stage()` / `add_usage()` without it being passed around. Work handed to a
+# thread pool must be wrapped with `in_context()` to stay on the same trace.
+
+TRACE_LOG = os.environ.get('TRACE_LOG', '1') != '0'
+PROFILE_RATE = float(os.environ.get('TRACE_PROFILE_RATE', 0))     # share of requests profiled
+PROFILE_INTERVAL = float(os.environ.get('TRACE_PROFILE_INTERVAL_MS', 5)) / 1000
+PROFILE_TOP = 15
+
+_current = contextvars.ContextVar('trace', default=None)
+
+
+class StackSampler:
+    """Stdlib sampling profiler: looks at the request thread every interval.
+
+    Any object with the same `start()` / `stop() -> list` interface can be
+    installed as `trace.PROFILER` instead (e.g. a pyinstrument wrapper).
+    """
+
+    def __init__(self, thread_id, interval=PROFILE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples = 0
+        self._counts = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            self.samples += 1
+            code = frame.f_code
+            self._counts[f"{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}"] += 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        """Hottest lines: the share of samples each was executing."""
+        self._stop.set()
+        self._thread.join()
+        total = max(self.samples, 1)
+        return [f"{where} {100 * n / total:.0f}%" for where, n in self._counts.most_common(PROFILE_TOP)]
+
+
+PROFILER = StackSampler
+
+
+class Trace:
+    """Stage timings, token usage and outcome of one request."""
+
+    def __init__(self, route):
+        self.route = route
+        self.started = time.perf_counter()
+        self.stages = {}            # name -> [total seconds, calls]
+        self.usage = Counter()
+        self.fields = {}
+        self.failed_stage = None
+        self._lock = threading.Lock()
+        self._profiler = None
+
+    @contextmanager
+    def stage(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        except BaseException:
+            # The innermost stage exits first, so it is the one that keeps the blame.
+            if self.failed_stage is None:
+                self.failed_stage = name
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                entry = self.stages.setdefault(name, [0.0, 0])
+                entry[0] += elapsed
+                entry[1] += 1
+
+    def add_usage(self, usage):
+        """Add a Groq `usage` object (prompt/completion/total tokens)."""
+        if not usage:
+            return
+        with self._lock:
+            for key in ('prompt_tokens', 'completion_tokens', 'total_tokens'):
+                self.usage[key] += usage.get(key) or 0
+
+    def set(self, **fields):
+        self.fields.update(fields)
+
+    def server_timing(self):
+        """Server-Timing header value for the stages finished so far."""
+        with self._lock:
+            items = list(self.stages.items())
+        parts = [f'{name};dur={total * 1000:.1f}' for name, (total, _) in items]
+        parts.append(f'total;dur={(time.perf_counter() - self.started) * 1000:.1f}')
+        return ', '.join(parts)
+
+    def finish(self, status, error=None):
+        """Write the request's JSON log line."""
+        if self._profiler:
+            self.fields['profile'] = self._profiler.stop()
+            self._profiler = None
+        if not TRACE_LOG:
+            return
+        with self._lock:
+            stages = {name: {'ms': round(total * 1000, 1), 'calls': calls}
+                      for name, (total, calls) in self.stages.items()}
+        record = {
+            'event': 'request',
+            'route': self.route,
+            'status': status,
+            'total_ms': round((time.perf_counter() - self.started) * 1000, 1),
+            'stages': stages,
+            'usage': dict(self.usage),
+            **self.fields,
+        }
+        if error is not None:
+            record['failed_stage'] = self.failed_stage
+            record['error_type'] = type(error).__name__
+            record['error'] = str(error)[:300]
+            record['where'] = _where(error)
+        print(json.dumps(record, ensure_ascii=False), flush=True)
+
+
+class _NoTrace(Trace):
+    """Stand-in when no request is being traced (scripts, the pool warmer)."""
+
+    def __init__(self):
+        super().__init__(None)
+
+    @contextmanager
+    def stage(self, name):
+        yield
+
+    def add_usage(self, usage):
+        pass
+
+    def set(self, **fields):
+        pass
+
+
+_NO_TRACE = _NoTrace()
+
+
+def _where(error):
+    """file:line of the deepest frame of `error`'s traceback."""
+    frames = traceback.extract_tb(error.__traceback__)
+    if not frames:
+        return None
+    last = frames[-1]
+    return f"{os.path.basename(last.filename)}:{last.lineno}"
+
+
+def begin(route):
+    """Start tracing the current request and make it the active trace."""
+    trace = Trace(route)
+    _current.set(trace)
+    if PROFILE_RATE and random.random() < PROFILE_RATE:
+        trace._profiler = PROFILER(threading.get_ident())
+        trace._profiler.start()
+    return trace
+
+
+def current():
+    return _current.get() or _NO_TRACE
+
+
+def stage(name):
+    """Time a block as `name` on the active trace (no-op when there is none)."""
+    return current().stage(name)
+
+
+def add_usage(usage):
+    current().add_usage(usage)
+
+
+def in_context(fn):
+    """Wrap `fn` so it runs on the caller's trace when executed in a pool thread."""
+    trace = _current.get()
+
+    def run(*args, **kwargs):
+        token = _current.set(trace)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _current.reset(token)
+    return run
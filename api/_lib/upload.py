@@ -0,0 +1,100 @@
+import os
+import re
+
+# ── BINARY UPLOADS ─────────────────────────────────────────────────
+# PDFs can be POSTed as raw `application/pdf` or `multipart/form-data`
+# instead of base64 inside JSON. The body is read once into one bytearray;
+# a multipart file part is trimmed out of that same buffer in place, so no
+# second copy of the file is ever held.
+
+MAX_UPLOAD_BYTES = int(os.environ.get('MAX_UPLOAD_BYTES', 10 * 1024 * 1024))
+
+_PART_NAME = re.compile(rb'name="([^"]*)"', re.I)
+_PART_FILENAME = re.compile(rb'filename="([^"]*)"', re.I)
+_PAGE_RANGE = re.compile(r'(\d+)\s*(?:-\s*(\d*))?')
+
+
+def read_body(rfile, length):
+    """Read exactly `length` bytes from `rfile` into a single bytearray."""
+    buf = bytearray(length)
+    view = memoryview(buf)
+    pos = 0
+    while pos < length:
+        n = rfile.readinto(view[pos:])
+        if not n:
+            raise Exception("Upload ended early.")
+        pos += n
+    view.release()
+    return buf
+
+
+def content_type(header):
+    """`(mime, params)` from a Content-Type header value."""
+    parts = [p.strip() for p in (header or '').split(';')]
+    params = {}
+    for p in parts[1:]:
+        if '=' in p:
+            k, v = p.split('=', 1)
+            params[k.strip().lower()] = v.strip().strip('"')
+    return parts[0].lower(), params
+
+
+def parse_multipart(buf, boundary):
+    """Split a multipart body into text fields and one file part.
+
+    Returns `(fields, filename)`; `buf` is trimmed in place to the bytes of
+    the first file part (left empty when there is none).
+    """
+    delimiter = b'--' + boundary.encode('latin-1')
+    fields = {}
+    filename = None
+    file_span = None
+    pos = buf.find(delimiter)
+    while pos != -1:
+        head_start = pos + len(delimiter)
+        if buf[head_start:head_start + 2] == b'--':
+            break
+        head_end = buf.find(b'\r\n\r\n', head_start)
+        if head_end == -1:
+            break
+        next_pos = buf.find(delimiter, head_end)
+        if next_pos == -1:
+            break
+        headers = bytes(buf[head_start:head_end])
+        start, end = head_end + 4, next_pos - 2     # drop the CRLF before the delimiter
+        name = _PART_NAME.search(headers)
+        fname = _PART_FILENAME.search(headers)
+        if fname and file_span is None:
+            filename = fname.group(1).decode('utf-8', 'replace')
+            file_span = (start, end)
+        elif name and not fname:
+            fields[name.group(1).decode('utf-8', 'replace')] = bytes(buf[start:end]).decode('utf-8', 'replace')
+        pos = next_pos
+
+    if file_span:
+        del buf[file_span[1]:]
+        del buf[:file_span[0]]
+    else:
+        del buf[:]
+    return fields, filename
+
+
+def parse_page_range(spec):
+    """'3-7' -> (3, 7); '5' or 5 -> (5, 5); '4-' -> (4, None); '' -> None. 1-based, inclusive.
+
+    Raises ValueError for anything else, page 0 included.
+    """
+    spec = '' if spec is None else str(spec).strip()
+    if not spec:
+        return None
+    m = _PAGE_RANGE.fullmatch(spec)
+    if not m:
+        raise ValueError(f"Invalid page range: {spec}")
+    first = int(m.group(1))
+    if m.group(2) is None:
+        last = first
+    else:
+        last = int(m.group(2)) if m.group(2) else None
+    if first < 1 or (last is not None and last < first):
+        raise ValueError(f"Invalid page range: {spec}")
+    return first, last
@@ -0,0 +1,180 @@
+from http.server import BaseHTTPRequestHandler
+import argparse
+import base64
+import binascii
+import json
+import os
+import sys
+import time
+from urllib.parse import parse_qsl, urlparse
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from _lib.custom import LESSONS, extract_text_from_pdf, scrape_url
+from _lib.jobs import BATCH_MAX_ITEMS, BATCH_WORKERS, JOB_STORE, work, work_in_background
+from _lib.handler import ApiResponses
+from _lib.trace import begin, current, stage
+from _lib.upload import MAX_UPLOAD_BYTES, parse_page_range
+
+# ── BATCH LESSON JOBS ──────────────────────────────────────────────
+# POST /api/batch  {"api_key", "items": [{"url"} | {"pdf_data", "filename", "pages"}]}
+#   -> 202 {"job_id"}; the items are queued and worked in the background.
+# GET  /api/batch?id=<job_id>            -> status and lessons of every item
+# GET  /api/batch?id=<job_id>&stream=1   -> Server-Sent Events as items finish
+
+STREAM_SECONDS = 50         # reconnect after this; stays inside maxDuration
+POLL_INTERVAL = 0.5
+
+
+def process_item(item):
+    """Worker step for one queued item: `(title, lesson, cache_status)`."""
+    if item['kind'] == 'pdf':
+        with stage('pdf'):
+            content = extract_text_from_pdf(item['pdf'], pages=parse_page_range(item['pages']))
+        title = item['source'].replace('.pdf', '').replace('_', ' ').replace('-', ' ')
+    else:
+        with stage('scrape'):
+            title, content = scrape_url(item['source'])
+    if not content or len(content.strip()) < 100:
+        raise Exception("Not enough text found. Try a different source.")
+    lesson, cache_status, _ = LESSONS.cached(title, content, item['api_key'])
+    return title, lesson, cache_status
+
+
+def parse_items(body):
+    """Validated queue items from a POST body; raises with a user-facing message."""
+    raw = body.get('items')
+    if raw is None:
+        urls = body.get('urls') or []
+        if not isinstance(urls, list):
+            raise ValueError('urls must be a list')
+        raw = [{'url': u} for u in urls]
+    if not isinstance(raw, list) or not raw:
+        raise ValueError('No items provided')
+    if len(raw) > BATCH_MAX_ITEMS:
+        raise ValueError(f'Too many items (max {BATCH_MAX_ITEMS})')
+    items = []
+    for i, entry in enumerate(raw):
+        if isinstance(entry, str):
+            entry = {'url': entry}
+        url = entry.get('url') if isinstance(entry, dict) else None
+        if url is not None and not isinstance(url, str):
+            raise ValueError(f'Item {i + 1}: url must be a string')
+        url = (url or '').strip()
+        if url:
+            items.append({'kind': 'url', 'source': url})
+        elif isinstance(entry, dict) and entry.get('pdf_data'):
+            try:
+                pdf = base64.b64decode(entry['pdf_data'], validate=True)
+            except (binascii.Error, TypeError, ValueError):
+                raise ValueError(f'Item {i + 1}: pdf_data is not valid base64')
+            if len(pdf) > MAX_UPLOAD_BYTES:
+                raise ValueError(f'Item {i + 1}: PDF too large (max 10MB)')
+            pages = entry.get('pages')
+            try:
+                parse_page_range(pages)
+            except ValueError as e:
+                raise ValueError(f'Item {i + 1}: {e}')
+            items.append({'kind': 'pdf', 'source': str(entry.get('filename') or f'document-{i + 1}.pdf'),
+                          'pdf': pdf, 'pages': pages})
+        else:
+            raise ValueError(f'Item {i + 1}: needs a url or pdf_data')
+    return items
+
+
+class handler(ApiResponses, BaseHTTPRequestHandler):
+    CORS_METHODS = 'GET, POST, OPTIONS'
+
+    def do_POST(self):
+        trace = begin('/api/batch')
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            body = json.loads(self.rfile.read(length))
+            if not isinstance(body, dict):
+                self._respond(400, {'success': False, 'error': 'Request body must be a JSON object'})
+                return
+            api_key = body.get('api_key', '')
+            api_key = api_key.strip() if isinstance(api_key, str) else ''
+
+            if not api_key:
+                self._respond(400, {'success': False, 'error': 'API key is required'})
+                return
+            try:
+                items = parse_items(body)
+            except ValueError as e:
+                self._respond(400, {'success': False, 'error': str(e)})
+                return
+
+            with stage('queue'):
+                job_id = JOB_STORE.create(api_key, items)
+            work_in_background(process_item)
+            trace.set(job_id=job_id, items=len(items))
+            self._respond(202, {
+                'success': True,
+                'job_id': job_id,
+                'total': len(items),
+                'status_url': f'/api/batch?id={job_id}',
+            })
+
+        except Exception as e:
+            self._respond(500, {'success': False, 'error': str(e), 'stage': trace.failed_stage}, error=e)
+
+    def do_GET(self):
+        begin('/api/batch?id')
+        query = dict(parse_qsl(urlparse(self.path).query))
+        job_id = query.get('id', '')
+        try:
+            job = JOB_STORE.job(job_id, lessons=query.get('lessons') != '0')
+            if job is None:
+                self._respond(404, {'success': False, 'error': 'Unknown job'})
+                return
+            if not job['finished']:
+                # Workers stop when the queue runs dry; a poll picks the job back up.
+                work_in_background(process_item)
+            if query.get('stream') in ('1', 'true'):
+                self._stream_progress(job_id, job)
+                return
+            self._respond(200, {'success': True, **job})
+        except Exception as e:
+            self._respond(500, {'success': False, 'error': str(e)}, error=e)
+
+    def _stream_progress(self, job_id, job):
+        """Send every finished item once, then `done` when the whole job is."""
+        trace = current()
+        self._start_events()
+
+        sent = set()
+        counts = None
+        deadline = time.time() + STREAM_SECONDS
+        while True:
+            for item in job['items']:
+                if item['status'] in ('done', 'error') and item['index'] not in sent:
+                    sent.add(item['index'])
+                    self._send_event('item', item)
+            if job['counts'] != counts:
+                counts = job['counts']
+                self._send_event('progress', {'job_id': job_id, 'total': job['total'], **counts})
+            if job['finished']:
+                self._send_event('done', {'job_id': job_id, **counts})
+                break
+            if time.time() > deadline:
+                self._send_event('pending', {'job_id': job_id, 'retry': f'/api/batch?id={job_id}&stream=1'})
+                break
+            time.sleep(POLL_INTERVAL)
+            job = JOB_STORE.job(job_id)
+        self._end_events()
+        trace.finish(200)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Work the batch job queue until interrupted.')
+    parser.add_argument('--worker', action='store_true', required=True)
+    parser.add_argument('--workers', type=int, default=BATCH_WORKERS, help='items processed in parallel')
+    args = parser.parse_args()
+    try:
+        work(process_item, workers=args.workers, idle_exit=False)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -1,73 +1,63 @@
 from http.server import BaseHTTPRequestHandler
 import json
-import requests
-from bs4 import BeautifulSoup
-import random
-import re
-import xml.etree.ElementTree as ET
-import datetime
+import os
+import sys
+import time
+from urllib.parse import parse_qsl, urlparse
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from _lib import cpu
+from _lib.articles import ARTICLE_STORE
+from _lib.cache import LESSON_CACHE
+from _lib.extract import extract_dlf_article
+from _lib.feeds import FEED_INDEX
+from _lib.hedge import SCRAPE_STATS
+from _lib.lesson import LessonGenerator
+from _lib.pool import LESSON_POOL, POOL_API_KEY
+from _lib.schema import pick
+from _lib.similar import SIMILAR_INDEX
+from _lib.handler import ApiResponses
+from _lib.streaming import lesson_events
+from _lib.trace import begin, stage
+
+PICK_TRIES = 4
 
 def get_random_article_url():
-    rss_links= ["https://www.deutschlandfunk.de/nachrichten-100.rss","https://www.deutschlandfunk.de/politikportal-100.rss","https://www.deutschlandfunk.de/wirtschaft-106.rss","https://www.deutschlandfunk.de/wissen-106.rss","https://www.deutschlandfunk.de/kulturportal-100.rss","https://www.deutschlandfunk.de/europa-112.rss","https://www.deutschlandfunk.de/gesellschaft-106.rss","https://www.deutschlandfunk.de/sportportal-100.rss"]
-    rss_url = rss_links[int(random.random()*len(rss_links))]
-    # print(rss_url)
-    headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64)'}
-    response = requests.get(rss_url, headers=headers, timeout=10)
-    root = ET.fromstring(response.content)
-    links = []
-    for item in root.findall('.//item'):
-        link = item.find('link')
-        if link is not None and link.text:
-            url = link.text
-            if url.endswith('.html') and "-100.html" not in url and "podcast" not in url:
-                links.append(url)
-    if not links:
-        raise Exception("Could not find any valid article links.")
-    return random.choice(links)
+    with stage('rss'):
+        return FEED_INDEX.random_url()
+
+def pick_article():
+    """Random `(url, title, content)`, not a near-duplicate of another article served lately.
+
+    A URL already known to duplicate one is skipped before it is scraped;
+    the last try is taken whatever it is.
+    """
+    for attempt in range(PICK_TRIES):
+        last = attempt == PICK_TRIES - 1
+        article_url = get_random_article_url()
+        if not last and SIMILAR_INDEX.served_recently(url=article_url):
+            SIMILAR_INDEX.stats['skipped'] += 1
+            continue
+        with stage('scrape'):
+            title, content = scrape_article_text(article_url)
+        with stage('similar'):
+            duplicate = not last and SIMILAR_INDEX.served_recently(content, article_url)
+            SIMILAR_INDEX.add(content, url=article_url, served=not duplicate)
+        if duplicate:
+            SIMILAR_INDEX.stats['skipped'] += 1
+            continue
+        return article_url, title, content
+
+def _extract_dlf(response):
+    with stage('html'):
+        return cpu.run(extract_dlf_article, response.text)
 
 def scrape_article_text(article_url):
+    """`(title, content)`, from the article store unless the page has changed."""
     headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64)'}
-    response = requests.get(article_url, headers=headers, timeout=10)
-    soup = BeautifulSoup(response.text, 'html.parser')
-
-    title_tag = soup.find('h1') or soup.find('h2')
-    title = title_tag.get_text(strip=True) if title_tag else "No Title Found"
-
-    content_lines = []
-
-    intro_para = soup.find('p', class_='article-header-description')
-    if intro_para:
-        intro_text = intro_para.get_text(strip=True)
-        if len(intro_text) > 20:
-            content_lines.append(intro_text)
-
-    for div in soup.find_all('div', class_='article-details-text'):
-        text = div.get_text(strip=True)
-        if len(text) > 20:
-            content_lines.append(text)
-
-    for title_elem, desc_elem in zip(
-        soup.find_all('h3', class_='teaser-word-title'),
-        soup.find_all('p', class_='teaser-word-description')
-    ):
-        word = title_elem.get_text(strip=True)
-        definition = desc_elem.get_text(strip=True)
-        if word and definition:
-            content_lines.append(f"{word}: {definition}")
-
-    content = " ".join(content_lines)
-    content = re.sub(r'\s+', ' ', content).strip()
-    return title, content
-
-def generate_ai_lesson(title, content, api_key):
-    # Call Groq API directly via HTTP — no SDK needed, no version issues
-    url = "https://api.groq.com/openai/v1/chat/completions"
-    headers = {
-        "Authorization": f"Bearer {api_key}",
-        "Content-Type": "application/json"
-    }
+    return ARTICLE_STORE.fetch('dlf', article_url, _extract_dlf, headers, timeout=10)
 
-    system_prompt = """You are an expert German language teacher creating interactive learning materials.
+SYSTEM_PROMPT_V1 = """You are an expert German language teacher creating interactive learning materials.
 Process this German news article into a structured lesson.
 
 Output ONLY valid JSON in this exact structure:
@@ -102,37 +92,72 @@ Rules:
 - Create 5-7 quiz questions in German
 - Do not stop until the entire article is processed"""
 
-    payload = {
-        "model": "llama-3.3-70b-versatile",
-        "messages": [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": f"Title: {title}\n\nContent:\n{content}"}
-        ],
-        "response_format": {"type": "json_object"},
-        "temperature": 0.3,
-        "max_tokens": 16000
+SYSTEM_PROMPT_V2 = """You are an expert German language teacher creating interactive learning materials.
+Process this German news article into a structured lesson.
+
+Output ONLY valid JSON in this exact structure:
+{
+  "title": "English translation of the article title",
+  "summary": "Brief 2-3 sentence summary in English",
+  "content": [
+    {
+      "n": 1,
+      "de": "Original German sentence.",
+      "en": "Accurate English translation.",
+      "new": { "GermanWord": "English meaning" },
+      "note": "Optional grammar note"
     }
+  ],
+  "vocabulary_highlights": [
+    { "word": "german_word", "translation": "English meaning", "usage_example": "Example sentence" }
+  ],
+  "quiz": [
+    {
+      "question": "Question in German?",
+      "options": ["Option 1", "Option 2", "Option 3", "Option 4"],
+      "correct_answer": "Option 1",
+      "explanation": "Why this is correct"
+    }
+  ]
+}
+
+Rules:
+- Process EVERY sentence, number them sequentially
+- "new" gives the meaning of every word of the sentence that did not appear in an earlier sentence; repeat a word only if its meaning differs here. Strip punctuation from keys
+- Create 5-7 quiz questions in German
+- Do not stop until the entire article is processed"""
 
-    response = requests.post(url, headers=headers, json=payload, timeout=90)
+SYSTEM_PROMPT = pick(SYSTEM_PROMPT_V1, SYSTEM_PROMPT_V2)
 
-    if response.status_code == 401:
-        raise Exception("invalid_api_key: Your Groq API key is invalid or expired.")
-    if response.status_code == 429:
-        raise Exception("rate_limit: Too many requests. Please wait a moment and try again.")
-    if response.status_code != 200:
-        raise Exception(f"groq_error_{response.status_code}: {response.text[:200]}")
+LESSONS = LessonGenerator(SYSTEM_PROMPT)
 
-    return response.json()['choices'][0]['message']['content']
+def warm_lesson(article_url):
+    """Pool builder: one lesson generated with the server's own API key."""
+    title, content = scrape_article_text(article_url)
+    if len(content) < 200:
+        return None
+    with stage('similar'):
+        if SIMILAR_INDEX.served_recently(content, article_url):
+            SIMILAR_INDEX.stats['skipped'] += 1
+            return None
+        SIMILAR_INDEX.add(content, url=article_url)
+    return LESSONS.cached(title, content, POOL_API_KEY)[0]
 
 
-class handler(BaseHTTPRequestHandler):
+class handler(ApiResponses, BaseHTTPRequestHandler):
+    CORS_METHODS = 'GET, POST, OPTIONS'
+    CORS_EXPOSE = 'X-Lesson-Cache, Server-Timing, ETag'
 
-    def do_OPTIONS(self):
-        self.send_response(200)
-        self._cors_headers()
-        self.end_headers()
+    def _authorized(self):
+        """Check the cron's bearer token (when CRON_SECRET is set); answers 401 if wrong."""
+        secret = os.environ.get('CRON_SECRET')
+        if secret and self.headers.get('Authorization') != f'Bearer {secret}':
+            self._respond(401, {'success': False, 'error': 'Unauthorized'})
+            return False
+        return True
 
     def do_POST(self):
+        trace = begin('/api')
         try:
             length = int(self.headers.get('Content-Length', 0))
             body = json.loads(self.rfile.read(length))
@@ -142,35 +167,64 @@ class handler(BaseHTTPRequestHandler):
                 self._respond(400, {'success': False, 'error': 'API key is required'})
                 return
 
-            article_url = get_random_article_url()
-            title, content = scrape_article_text(article_url)
+            with stage('pool'):
+                pooled = LESSON_POOL.pop()
+            if POOL_API_KEY:
+                LESSON_POOL.refill_in_background(warm_lesson)
+
+            if pooled:
+                article_url, lesson_data = pooled
+                cache_status = 'pool'
+                key = None
+                if body.get('stream'):
+                    self._stream_lesson('pool', lesson_events(lesson_data), None, article_url)
+                    return
+            else:
+                article_url, title, content = pick_article()
+                if len(content) < 200:
+                    raise Exception("Article content too short, please try again.")
 
-            if len(content) < 200:
-                raise Exception("Article content too short, please try again.")
+                if body.get('stream'):
+                    self._stream_lesson(*LESSONS.stream(title, content, api_key), article_url)
+                    return
 
-            lesson_data = json.loads(generate_ai_lesson(title, content, api_key))
+                lesson_data, cache_status, key = LESSONS.cached(title, content, api_key)
 
-            self._respond(200, {
-                'success': True,
-                'data': {
-                    'source_url': article_url,
-                    'generated_at': datetime.datetime.now().isoformat(),
-                    **lesson_data
-                }
-            })
+            self._send_lesson(article_url, lesson_data, cache_status, key)
 
         except Exception as e:
             error_msg = str(e)
-            self._respond(500, {'success': False, 'error': error_msg})
-
-    def _respond(self, status, data):
-        self.send_response(status)
-        self.send_header('Content-Type', 'application/json')
-        self._cors_headers()
-        self.end_headers()
-        self.wfile.write(json.dumps(data).encode())
-
-    def _cors_headers(self):
-        self.send_header('Access-Control-Allow-Origin', '*')
-        self.send_header('Access-Control-Allow-Methods', 'POST, OPTIONS')
-        self.send_header('Access-Control-Allow-Headers', 'Content-Type')
\ No newline at end of file
+            self._respond(500, {'success': False, 'error': error_msg, 'stage': trace.failed_stage}, error=e)
+
+    def do_GET(self):
+        """GET /api?lesson=<key> returns a cached lesson; the cron entry point
+        GET /api?warm=1 tops up the lesson pool and GET /api?stats=1 reports
+        this instance's cache counters and per-domain scrape strategy stats."""
+        query = dict(parse_qsl(urlparse(self.path).query))
+        if 'lesson' in query:
+            begin('/api?lesson')
+            self._send_cached_lesson(query['lesson'])
+            return
+        if 'stats' in query:
+            begin('/api?stats')
+            if self._authorized():
+                self._respond(200, {'success': True, 'lesson_cache': dict(LESSON_CACHE.stats),
+                                    'scrape': SCRAPE_STATS.snapshot()},
+                              {'Cache-Control': 'no-store'})
+            return
+        begin('/api?warm')
+        if 'warm' not in query:
+            self._respond(404, {'success': False, 'error': 'Not found'})
+            return
+        if not self._authorized():
+            return
+        if not POOL_API_KEY:
+            self._respond(503, {'success': False, 'error': 'GROQ_API_KEY is not configured'})
+            return
+        try:
+            # Leave headroom inside the 60 s maxDuration.
+            with stage('refill'):
+                added = LESSON_POOL.refill(warm_lesson, deadline=time.time() + 40)
+            self._respond(200, {'success': True, 'added': added, 'pool': LESSON_POOL.counts()})
+        except Exception as e:
+            self._respond(500, {'success': False, 'error': str(e)}, error=e)
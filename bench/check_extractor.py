@@ -0,0 +1,59 @@
+"""Check the single-pass extractor against the recorded fixture corpus.
+
+Every bench/fixtures/pages/<name>.html has a <name>.expected.json with the
+(title, content) the previous BeautifulSoup strategy chain returned for it,
+except where the file has a "divergence" note: on those pages the old chain
+failed outright, and the expected output is the new extractor's, recorded
+on purpose.
+The script also times one synthetic, deeply nested page to keep an eye on
+the linear-time guarantee.
+
+    python bench/check_extractor.py
+"""
+import glob
+import json
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'api'))
+
+from _lib.extract import extract_article  # noqa: E402
+
+PAGES = os.path.join(ROOT, 'bench', 'fixtures', 'pages')
+
+
+def deep_page(depth=1500, paragraphs=3000):
+    para = '<p>Dies ist ein ausreichend langer Absatz mit deutschem Beispieltext.</p>'
+    return ('<html><body>' + '<div>' * depth + '<section>' + para * paragraphs +
+            '</section>' + '</div>' * depth + '</body></html>')
+
+
+def main():
+    failures = 0
+    for path in sorted(glob.glob(os.path.join(PAGES, '*.html'))):
+        name = os.path.basename(path)
+        with open(path, encoding='utf-8') as f:
+            html = f.read()
+        with open(path[:-5] + '.expected.json', encoding='utf-8') as f:
+            expected = json.load(f)
+        title, content = extract_article(html)
+        ok = title == expected['title'] and content == expected['content']
+        failures += not ok
+        note = ' (intentional divergence)' if expected.get('divergence') else ''
+        print(f"{'ok  ' if ok else 'FAIL'} {name}{note}")
+        if not ok:
+            print(f"     expected title={expected['title']!r}\n     got      title={title!r}")
+
+    html = deep_page()
+    start = time.perf_counter()
+    extract_article(html)
+    elapsed = time.perf_counter() - start
+    print(f"deep page: {len(html) // 1024} KB in {elapsed * 1000:.0f} ms")
+
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,48 @@
+"""Syntax-check the script in index.html.
+
+The whole UI is one inline <script>; a single syntax error in it leaves
+every button dead without any error from the API. Each inline script is
+written to a temporary file and run through `node --check`.
+
+    python bench/check_page.py
+"""
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PAGE = os.path.join(ROOT, 'index.html')
+
+_INLINE_SCRIPT = re.compile(r'<script>(.*?)</script>', re.S)
+
+
+def main():
+    node = shutil.which('node')
+    if not node:
+        print('node not found; cannot check index.html')
+        return 1
+    with open(PAGE, encoding='utf-8') as f:
+        html = f.read()
+    failures = 0
+    for i, script in enumerate(_INLINE_SCRIPT.findall(html)):
+        # Line numbers in node's errors are relative to the opening <script> tag.
+        line = html[:html.index(script)].count('\n')
+        with tempfile.NamedTemporaryFile('w', suffix='.js', encoding='utf-8', delete=False) as f:
+            f.write(script)
+        try:
+            result = subprocess.run([node, '--check', f.name], capture_output=True, text=True)
+        finally:
+            os.unlink(f.name)
+        ok = result.returncode == 0
+        failures += not ok
+        print(f"{'ok  ' if ok else 'FAIL'} index.html script {i + 1} (from line {line + 1})")
+        if not ok:
+            print(result.stderr.strip())
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,236 @@
+"""Local stand-in for Groq's OpenAI-compatible chat completions endpoint.
+
+It answers with a plausible lesson built from the text it was sent: one
+content item per input sentence with a meaning for every word, so output
+size scales with the article the way the real model's does. The three prompt
+shapes the app uses (full lesson, content-only chunk, overview) and the two
+lesson schemas (v1, compact v2) are told apart by the JSON skeleton in the
+system prompt. Pre-split input ("Sentences:" with "Known words:") gets the
+items the app asks for then: no "de", and no known words in "new".
+
+    python bench/fake_groq.py --port 8081 --latency 0.4 --token-rate 400
+
+Knobs: time to first token, output tokens per second, probability of a 429
+(with Retry-After) and probability of an output cut short at max_tokens. A
+cut-off JSON-mode answer comes back the way Groq sends it: a 400
+json_validate_failed carrying the partial text in failed_generation.
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CHARS_PER_TOKEN = 4
+
+
+def _sentences(text):
+    parts = re.split(r'(?<=[.!?])\s+', text.strip())
+    return [p for p in parts if len(p) > 1]
+
+
+def _words(sentence):
+    return [w for w in re.findall(r'[\wÄÖÜäöüß-]+', sentence) if not w.isdigit()]
+
+
+def _item(number, sentence):
+    return {
+        'sentence_number': number,
+        'german_sentence': sentence,
+        'english_translation': f'[en] {sentence}',
+        'word_meanings': {w: f'meaning of {w}' for w in _words(sentence)},
+        'grammar_notes': 'Verb in second position.' if number % 3 == 0 else '',
+    }
+
+
+def _item_v2(number, sentence, seen, prepared=False):
+    """Compact item: only words not given in an earlier sentence."""
+    new = {}
+    for w in _words(sentence):
+        if w.casefold() not in seen:
+            seen.add(w.casefold())
+            new[w] = f'meaning of {w}'
+    item = {
+        'n': number,
+        'de': sentence,
+        'en': f'[en] {sentence}',
+        'new': new,
+        'note': 'Verb in second position.' if number % 3 == 0 else '',
+    }
+    if prepared:
+        del item['de']
+    return item
+
+
+def _overview(title, text):
+    words = sorted({w for w in _words(text) if len(w) > 7})[:8]
+    return {
+        'title': f'[en] {title}',
+        'summary': 'A short English summary of the article. ' * 2,
+        'vocabulary_highlights': [
+            {'word': w, 'translation': f'meaning of {w}', 'usage_example': f'Das Wort {w} steht im Text.'}
+            for w in words
+        ],
+        'quiz': [
+            {
+                'question': f'Frage {i + 1} zum Text?',
+                'options': ['A', 'B', 'C', 'D'],
+                'correct_answer': 'A',
+                'explanation': 'Steht so im Text.',
+            }
+            for i in range(6)
+        ],
+    }
+
+
+def build_reply(payload):
+    """The assistant message the fake model 'writes' for this request."""
+    system = payload['messages'][0]['content']
+    user = payload['messages'][-1]['content']
+    title = user.split('\n', 1)[0].replace('Title:', '').strip()
+    m = re.search(r'\n(?:Content|Part|Text|Sentences):\n(.*)', user, re.S)
+    text = m.group(1) if m else user
+    prepared = '\nSentences:\n' in user
+    known = set()
+    if prepared:
+        text, _, words = text.partition('\n\nKnown words: ')
+        known = {w.casefold() for w in words.split(', ') if w}
+        sentences = re.findall(r'^\d+\. (.*)$', text, re.M)
+        text = ' '.join(sentences)
+    else:
+        sentences = _sentences(text)
+    has_content = '"content"' in system
+    has_quiz = '"quiz"' in system
+    compact = '"new"' in system
+
+    lesson = {}
+    if has_quiz:
+        lesson.update({k: v for k, v in _overview(title, text).items() if k in ('title', 'summary')})
+    if has_content:
+        if compact:
+            seen = set(known)
+            lesson['content'] = [_item_v2(i + 1, s, seen, prepared) for i, s in enumerate(sentences)]
+        else:
+            lesson['content'] = [_item(i + 1, s) for i, s in enumerate(sentences)]
+    if has_quiz:
+        lesson.update({k: v for k, v in _overview(title, text).items() if k not in ('title', 'summary')})
+    return json.dumps(lesson, ensure_ascii=False)
+
+
+class FakeGroqHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        opts = self.server.opts
+        payload = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+        with self.server.lock:
+            self.server.calls += 1
+
+        if random.random() < opts.rate_limit:
+            body = json.dumps({'error': {'message': 'Rate limit reached', 'type': 'rate_limit'}}).encode()
+            self.send_response(429)
+            self.send_header('Retry-After', '1')
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+
+        reply = build_reply(payload)
+        finish = 'stop'
+        max_chars = payload.get('max_tokens', 16000) * CHARS_PER_TOKEN
+        if len(reply) > max_chars:
+            reply, finish = reply[:max_chars], 'length'
+        if random.random() < opts.truncate:
+            reply, finish = reply[:int(len(reply) * random.uniform(0.4, 0.9))], 'length'
+
+        prompt_tokens = sum(len(m['content']) for m in payload['messages']) // CHARS_PER_TOKEN
+        completion_tokens = len(reply) // CHARS_PER_TOKEN
+        with self.server.lock:
+            self.server.completion_tokens += completion_tokens
+        usage = {'prompt_tokens': prompt_tokens, 'completion_tokens': completion_tokens,
+                 'total_tokens': prompt_tokens + completion_tokens}
+
+        time.sleep(opts.latency)
+        if payload.get('stream'):
+            self._stream(reply, finish, usage)
+        elif finish == 'length' and payload.get('response_format', {}).get('type') == 'json_object':
+            # What Groq does when JSON mode output is cut off.
+            time.sleep(completion_tokens / opts.token_rate)
+            body = json.dumps({'error': {
+                'message': 'Failed to generate JSON. Please adjust your prompt.',
+                'type': 'invalid_request_error', 'code': 'json_validate_failed',
+                'failed_generation': reply}}).encode()
+            self.send_response(400)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        else:
+            time.sleep(completion_tokens / opts.token_rate)
+            body = json.dumps({
+                'id': 'chatcmpl-fake', 'object': 'chat.completion', 'model': payload.get('model'),
+                'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': reply},
+                             'finish_reason': finish}],
+                'usage': usage,
+            }).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    def _stream(self, reply, finish, usage):
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        step = 16 * CHARS_PER_TOKEN
+        for i in range(0, len(reply), step):
+            piece = reply[i:i + step]
+            time.sleep(len(piece) / CHARS_PER_TOKEN / self.server.opts.token_rate)
+            chunk = {'choices': [{'index': 0, 'delta': {'content': piece}, 'finish_reason': None}]}
+            self.wfile.write(f'data: {json.dumps(chunk)}\n\n'.encode())
+        last = {'choices': [{'index': 0, 'delta': {}, 'finish_reason': finish}], 'x_groq': {'usage': usage}}
+        self.wfile.write(f'data: {json.dumps(last)}\n\ndata: [DONE]\n\n'.encode())
+        self.close_connection = True
+
+    def log_message(self, *args):
+        pass
+
+
+def serve(host='127.0.0.1', port=0, latency=0.3, token_rate=500.0, rate_limit=0.0, truncate=0.0):
+    """Start the fake server on a daemon thread; returns the server object."""
+    server = ThreadingHTTPServer((host, port), FakeGroqHandler)
+    server.daemon_threads = True
+    server.opts = argparse.Namespace(latency=latency, token_rate=token_rate,
+                                     rate_limit=rate_limit, truncate=truncate)
+    server.lock = threading.Lock()
+    server.calls = 0
+    server.completion_tokens = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--latency', type=float, default=0.3, help='seconds before the first token')
+    parser.add_argument('--token-rate', type=float, default=500.0, help='output tokens per second')
+    parser.add_argument('--rate-limit', type=float, default=0.0, help='probability of a 429')
+    parser.add_argument('--truncate', type=float, default=0.0, help='probability of a cut-off output')
+    args = parser.parse_args()
+    server = serve(args.host, args.port, args.latency, args.token_rate, args.rate_limit, args.truncate)
+    print(f'fake Groq on http://{args.host}:{server.server_port}/openai/v1/chat/completions')
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""Cold-start import time of each API handler, checked against a budget.
+
+    python bench/import_time.py                  # median of 7 fresh interpreters
+    python bench/import_time.py --budget-ms 100 --runs 11 --top 15
+
+Each run starts a new interpreter and times only the import of the handler
+file, by path, the way Vercel loads it (interpreter startup excluded). The
+median per handler is compared with the budget, and the script exits 1 if
+any handler is over it, so it can run as a check before deploying. --top
+lists the slowest modules `python -X importtime` sees outside the app's own
+code, to show what a regression pulled in.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+API = os.path.join(os.path.dirname(ROOT), 'api')
+HANDLERS = ['index.py', 'process-custom.py', 'batch.py']
+BUDGET_MS = float(os.environ.get('IMPORT_BUDGET_MS', 80))
+
+CHILD = '''
+import sys, time, importlib.util
+sys.stderr.write('-- handler import --\\n')
+started = time.perf_counter()
+sys.path.insert(0, {api!r})
+spec = importlib.util.spec_from_file_location('handler_under_test', {path!r})
+module = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(module)
+print((time.perf_counter() - started) * 1000)
+'''
+
+
+def _child(filename):
+    return CHILD.format(api=API, path=os.path.join(API, filename))
+
+
+def _env():
+    # Nothing at import time should need these, but keep the runs hermetic.
+    return {**os.environ, 'TRACE_LOG': '0', 'PYTHONDONTWRITEBYTECODE': '0'}
+
+
+def measure(filename, runs):
+    """Milliseconds to import `filename` in each of `runs` fresh interpreters."""
+    times = []
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, '-c', _child(filename)], env=_env(),
+                             capture_output=True, text=True, check=True)
+        times.append(float(out.stdout.strip().splitlines()[-1]))
+    return times
+
+
+def slowest_modules(filename, top):
+    """`(cumulative_ms, module)` for the slowest non-app imports of one handler."""
+    out = subprocess.run([sys.executable, '-X', 'importtime', '-c', _child(filename)], env=_env(),
+                         capture_output=True, text=True, check=True)
+    rows = []
+    # Only what the handler import itself pulled in, not interpreter startup.
+    for line in out.stderr.split('-- handler import --\n', 1)[-1].splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        name = name.strip()
+        if name.startswith(('_lib', 'handler_under_test')):
+            continue
+        rows.append((int(cumulative) / 1000, name))
+    return sorted(rows, reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check handler cold-start import time against a budget.')
+    parser.add_argument('--budget-ms', type=float, default=BUDGET_MS, help='median import time allowed')
+    parser.add_argument('--runs', type=int, default=7)
+    parser.add_argument('--top', type=int, default=0, help='also list the N slowest imported modules')
+    args = parser.parse_args()
+
+    over = []
+    for filename in HANDLERS:
+        times = measure(filename, args.runs)
+        median = statistics.median(times)
+        verdict = 'ok' if median <= args.budget_ms else 'OVER BUDGET'
+        print(f'{filename:20} median {median:6.1f} ms  min {min(times):6.1f}  max {max(times):6.1f}'
+              f'  (budget {args.budget_ms:.0f} ms)  {verdict}')
+        if median > args.budget_ms:
+            over.append(filename)
+        for ms, name in slowest_modules(filename, args.top) if args.top else []:
+            print(f'    {ms:7.1f} ms  {name}')
+    sys.exit(1 if over else 0)
+
+
+if __name__ == '__main__':
+    main()
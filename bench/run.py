@@ -0,0 +1,403 @@
+"""Drive both /api handlers under concurrent load, entirely offline.
+
+Starts the fake Groq server and the fixture server, points the app at them
+through its environment overrides, serves api/index.py and
+api/process-custom.py on local ports and fires requests at them from a
+thread pool. Each stage function is wrapped with a timer, so the report has
+latency percentiles per stage (rss, scrape, extract, pdf, generate) next to
+the end-to-end numbers, plus throughput and the process's peak RSS.
+
+    python bench/run.py                          # every scenario, 24 requests each
+    python bench/run.py -s url -s pdf -n 50 -c 8 --token-rate 300
+    python bench/run.py --rate-limit 0.1 --truncate 0.05 --json out.json
+
+Scenarios: random, url, pdf and their streaming variants (random-stream,
+url-stream, pdf-stream), which also report the time to the first sentence.
+The lesson cache and the scraped-article store are off unless --cache is
+given (with ARTICLE_FRESH=0 every repeat URL is a conditional GET). --schema
+v1 compares the original lesson format with the compact v2 one and
+--no-preprocess sends v2 lessons the raw text instead of pre-split
+sentences. --asyncio serves the handlers through server.py instead of one
+http.server per handler. Peak RSS covers the whole benchmark process,
+stand-in servers included.
+
+Clients send Accept-Encoding: br (gzip without the brotli package; see
+--encoding), and each scenario reports its median response size on the wire
+and decoded, with the estimated time to receive it on a slow and a fast 3G
+link. The same is shown for index.html in every encoding server.py serves,
+and for a 304 revalidation of it.
+"""
+import argparse
+import asyncio
+import glob
+import importlib.util
+import json
+import os
+import resource
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+API = os.path.join(os.path.dirname(ROOT), 'api')
+sys.path.insert(0, ROOT)
+
+import fake_groq  # noqa: E402
+import static_server  # noqa: E402
+
+SCENARIOS = ['random', 'url', 'pdf', 'random-stream', 'url-stream', 'pdf-stream']
+
+# Chrome DevTools throttling presets: (download bits/s, round trip s).
+MOBILE_PROFILES = {'slow 3G': (400_000, 2.0), 'fast 3G': (1_440_000, 0.5625)}
+
+# (module, function name, stage) wrapped with a timer once the handlers load.
+STAGES = [
+    ('index', 'get_random_article_url', 'rss'),
+    ('index', 'scrape_article_text', 'scrape'),
+    ('custom', 'scrape_url', 'scrape'),
+    ('custom', 'extract_text_from_pdf', 'pdf'),
+    ('_lib.custom', 'extract_article', 'extract'),
+    ('_lib.lesson', 'prepare', 'preprocess'),
+    ('_lib.lesson', 'generate_chunked_lesson', 'generate'),
+    ('LessonGenerator', 'generate', 'generate'),
+]
+
+# Called through _lib.cpu.run(), so they must stay plain module functions.
+CPU_FUNCTIONS = {'extract_article'}
+
+
+class Timings:
+    """Thread-safe list of (stage, seconds) samples for the running scenario."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = []
+
+    def add(self, stage, seconds):
+        with self._lock:
+            self.samples.append((stage, seconds))
+
+    def take(self):
+        with self._lock:
+            samples, self.samples = self.samples, []
+        return samples
+
+
+TIMINGS = Timings()
+
+
+def _timed(fn, stage):
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            TIMINGS.add(stage, time.perf_counter() - started)
+    return wrapper
+
+
+def _load(name, filename):
+    spec = importlib.util.spec_from_file_location(name, os.path.join(API, filename))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def _quiet(module):
+    return type('handler', (module.handler,), {'log_message': lambda self, *args: None})
+
+
+def _serve(module):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _quiet(module))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f'http://127.0.0.1:{server.server_port}/'
+
+
+def _serve_asyncio(modules, cpu_workers):
+    """Both handlers behind server.py's asyncio front end, on one port."""
+    sys.path.insert(0, os.path.dirname(ROOT))
+    import server
+    server.start_cpu_pool(cpu_workers)
+    handlers = {'/api': _quiet(modules['index']), '/api/process-custom': _quiet(modules['custom'])}
+    ready = threading.Event()
+    port = []
+
+    def run():
+        async def main():
+            app = server.App(handlers)
+            await server.serve(app, '127.0.0.1', 0, stop=asyncio.Event(),
+                               ready=lambda p: (port.append(p), ready.set()))
+        asyncio.run(main())
+
+    threading.Thread(target=run, daemon=True).start()
+    ready.wait()
+    base = f'http://127.0.0.1:{port[0]}/'
+    return {'index': base + 'api', 'custom': base + 'api/process-custom'}
+
+
+def setup(args):
+    """Start the stand-ins, configure the app for them and serve both handlers."""
+    groq = fake_groq.serve(latency=args.latency, token_rate=args.token_rate,
+                           rate_limit=args.rate_limit, truncate=args.truncate)
+    site = static_server.serve(latency=args.site_latency)
+    state = tempfile.mkdtemp(prefix='german_article_bench_')
+    os.environ.update({
+        'GROQ_API_URL': f'http://127.0.0.1:{groq.server_port}/openai/v1/chat/completions',
+        'RSS_FEEDS': ','.join(static_server.feed_urls(site)),
+        'JINA_READER_URL': f'{site.base_url}/jina/',
+        'LESSON_CACHE_PATH': os.path.join(state, 'lessons.sqlite'),
+        'LESSON_POOL_PATH': os.path.join(state, 'pool.sqlite'),
+        'ARTICLE_STORE_PATH': os.path.join(state, 'articles.sqlite'),
+        'SIMILAR_INDEX_PATH': os.path.join(state, 'similar.sqlite'),
+    })
+    if not args.cache:
+        os.environ['LESSON_CACHE_TTL'] = '0'
+        os.environ['ARTICLE_TTL'] = '0'
+    os.environ['LESSON_SCHEMA'] = args.schema
+    os.environ['LESSON_PREPROCESS'] = '0' if args.no_preprocess else '1'
+    os.environ.pop('GROQ_API_KEY', None)    # keep the lesson pool out of the numbers
+    os.environ.setdefault('TRACE_LOG', '0')   # TRACE_LOG=1 to see the per-request log lines
+    # Every benchmark request shares one API key; only the fake server limits it
+    # unless GROQ_RPM / GROQ_TPM are set explicitly.
+    os.environ.setdefault('GROQ_RPM', '0')
+    os.environ.setdefault('GROQ_TPM', '0')
+    if args.asyncio:
+        os.environ.setdefault('HTTP_POOL_PER_HOST', '256')
+        os.environ.setdefault('SCRAPE_WORKERS', '512')
+
+    modules = {'index': _load('bench_index', 'index.py'),
+               'custom': _load('bench_process_custom', 'process-custom.py')}
+    modules['_lib.custom'] = sys.modules['_lib.custom']
+    modules['_lib.lesson'] = sys.modules['_lib.lesson']
+    modules['LessonGenerator'] = modules['_lib.lesson'].LessonGenerator
+    for module, name, stage in STAGES:
+        if args.asyncio and args.cpu_workers and name in CPU_FUNCTIONS:
+            continue    # sent to the process pool, which cannot pickle the timer
+        setattr(modules[module], name, _timed(getattr(modules[module], name), stage))
+
+    if args.asyncio:
+        urls = _serve_asyncio(modules, args.cpu_workers)
+    else:
+        urls = {'index': _serve(modules['index']), 'custom': _serve(modules['custom'])}
+    pages = sorted(glob.glob(os.path.join(static_server.FIXTURES, 'pages', '*.html')) +
+                   glob.glob(os.path.join(static_server.FIXTURES, 'articles', '*.html')))
+    targets = [f'{site.base_url}/{os.path.basename(os.path.dirname(p))}/{os.path.basename(p)}'
+               for p in pages]
+    pdfs = sorted(glob.glob(os.path.join(static_server.FIXTURES, 'pdf', '*.pdf')))
+    return groq, urls, targets, pdfs
+
+
+def build_request(scenario, i, urls, targets, pdfs):
+    """The i-th urllib Request for `scenario`."""
+    kind, _, stream = scenario.partition('-')
+    stream = bool(stream)
+    if kind == 'random':
+        body = json.dumps({'api_key': 'bench', 'stream': stream}).encode()
+        return urllib.request.Request(urls['index'], body, {'Content-Type': 'application/json'})
+    if kind == 'url':
+        body = json.dumps({'api_key': 'bench', 'mode': 'url', 'url': targets[i % len(targets)],
+                           'stream': stream}).encode()
+        return urllib.request.Request(urls['custom'], body, {'Content-Type': 'application/json'})
+    path = pdfs[i % len(pdfs)]
+    with open(path, 'rb') as f:
+        body = f.read()
+    query = f'?filename={os.path.basename(path)}' + ('&stream=1' if stream else '')
+    return urllib.request.Request(urls['custom'] + query, body,
+                                  {'Content-Type': 'application/pdf', 'X-Api-Key': 'bench'})
+
+
+def _decoder(encoding):
+    if encoding == 'gzip':
+        return zlib.decompressobj(31).decompress
+    if encoding == 'br':
+        import brotli
+        return brotli.Decompressor().process
+    return bytes
+
+
+def send(request, timeout):
+    """Run one request; returns (ok, seconds, seconds to first sentence or None, error,
+    bytes on the wire, bytes decoded)."""
+    started = time.perf_counter()
+    first = None
+    wire = raw = 0
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as r:
+            decode = _decoder(r.headers.get('Content-Encoding'))
+            if not r.headers.get('Content-Type', '').startswith('text/event-stream'):
+                body = r.read()
+                data = decode(body)
+                json.loads(data)
+                return True, time.perf_counter() - started, None, None, len(body), len(data)
+            # Read to the end, past `done`, so the byte counts cover the whole stream.
+            outcome = (False, 'stream ended without done')
+            event = None
+            buffer = b''
+            while True:
+                chunk = r.read1(65536)
+                if not chunk:
+                    break
+                data = decode(chunk)
+                wire, raw = wire + len(chunk), raw + len(data)
+                *lines, buffer = (buffer + data).split(b'\n')
+                for line in lines:
+                    line = line.decode('utf-8')
+                    if line.startswith('event: '):
+                        event = line[7:]
+                    elif line.startswith('data: ') and event == 'sentence' and first is None:
+                        first = time.perf_counter() - started
+                    elif line.startswith('data: ') and event == 'error':
+                        outcome = (False, json.loads(line[6:])['error'])
+                    elif line.startswith('data: ') and event == 'done':
+                        outcome = (True, None)
+            return outcome[0], time.perf_counter() - started, first, outcome[1], wire, raw
+    except urllib.error.HTTPError as e:
+        try:
+            error = json.loads(_decoder(e.headers.get('Content-Encoding'))(e.read())).get('error', str(e))
+        except ValueError:
+            error = str(e)
+        return False, time.perf_counter() - started, None, error, wire, raw
+    except Exception as e:
+        return False, time.perf_counter() - started, None, str(e), wire, raw
+
+
+def percentiles(values):
+    if not values:
+        return None
+    values = sorted(values)
+    pick = lambda q: values[min(len(values) - 1, int(len(values) * q))]  # noqa: E731
+    return {'n': len(values), 'p50': round(pick(0.5) * 1000), 'p90': round(pick(0.9) * 1000),
+            'p99': round(pick(0.99) * 1000), 'max': round(values[-1] * 1000)}
+
+
+def mobile_ms(size, round_trips=1):
+    """Estimated milliseconds to receive `size` bytes on each MOBILE_PROFILES link."""
+    return {name: round((round_trips * rtt + size * 8 / bps) * 1000)
+            for name, (bps, rtt) in MOBILE_PROFILES.items()}
+
+
+def transfer(sizes):
+    """p50 response size on the wire and decoded, and what the wire size costs on mobile."""
+    if not sizes:
+        return None
+    wire = sorted(w for w, _ in sizes)[len(sizes) // 2]
+    raw = sorted(r for _, r in sizes)[len(sizes) // 2]
+    return {'wire_bytes': wire, 'raw_bytes': raw, 'ratio': round(raw / wire, 1) if wire else None,
+            'mobile_ms': mobile_ms(wire)}
+
+
+def index_transfer(delivery):
+    """index.html in each encoding server.py sends it in, and a 304 revalidation."""
+    with open(os.path.join(os.path.dirname(ROOT), 'index.html'), 'rb') as f:
+        html = f.read()
+    sizes = {'identity': len(html)}
+    for encoding in delivery.encodings():
+        sizes[encoding] = len(delivery.compress(html, encoding, best=True))
+    result = {encoding: {'wire_bytes': size, 'mobile_ms': mobile_ms(size)}
+              for encoding, size in sizes.items()}
+    result['304'] = {'wire_bytes': 0, 'mobile_ms': mobile_ms(0)}
+    return result
+
+
+def run_scenario(scenario, args, urls, targets, pdfs, groq):
+    TIMINGS.take()
+    calls_before, tokens_before = groq.calls, groq.completion_tokens
+    requests = [build_request(scenario, i, urls, targets, pdfs) for i in range(args.requests)]
+    for request in requests:
+        request.add_header('Accept-Encoding', args.encoding)
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as workers:
+        results = list(workers.map(lambda r: send(r, args.timeout), requests))
+    wall = time.perf_counter() - started
+
+    stages = {}
+    for stage, seconds in TIMINGS.take():
+        stages.setdefault(stage, []).append(seconds)
+    errors = {}
+    for ok, _, _, error, _, _ in results:
+        if not ok:
+            errors[error[:80]] = errors.get(error[:80], 0) + 1
+    return {
+        'scenario': scenario,
+        'requests': len(results),
+        'ok': sum(r[0] for r in results),
+        'throughput_rps': round(len(results) / wall, 2),
+        'total_ms': percentiles([r[1] for r in results]),
+        'first_sentence_ms': percentiles([r[2] for r in results if r[2] is not None]),
+        'transfer': transfer([(r[4], r[5]) for r in results if r[0]]),
+        'stages_ms': {stage: percentiles(v) for stage, v in sorted(stages.items())},
+        'groq_calls': groq.calls - calls_before,
+        'groq_completion_tokens': groq.completion_tokens - tokens_before,
+        'errors': errors,
+    }
+
+
+def print_report(report):
+    row = '  {:<16} {:>5} {:>8} {:>8} {:>8} {:>8}'
+    for s in report['scenarios']:
+        print(f"\n{s['scenario']}: {s['ok']}/{s['requests']} ok, {s['throughput_rps']} req/s, "
+              f"{s['groq_calls']} Groq calls, {s['groq_completion_tokens']} completion tokens")
+        print(row.format('stage', 'n', 'p50 ms', 'p90 ms', 'p99 ms', 'max ms'))
+        lines = [('total', s['total_ms']), ('first sentence', s['first_sentence_ms'])]
+        for name, p in lines + list(s['stages_ms'].items()):
+            if p:
+                print(row.format(name, p['n'], p['p50'], p['p90'], p['p99'], p['max']))
+        t = s['transfer']
+        if t:
+            mobile = ', '.join(f'{name} {ms} ms' for name, ms in t['mobile_ms'].items())
+            print(f"  transfer p50: {t['wire_bytes'] / 1024:.1f} KB on the wire, "
+                  f"{t['raw_bytes'] / 1024:.1f} KB decoded (x{t['ratio']}); {mobile}")
+        for error, count in s['errors'].items():
+            print(f'  error x{count}: {error}')
+    print(f"\nindex.html ({report['config']['encoding']} requested by the scenarios above):")
+    for encoding, t in report['index_html'].items():
+        mobile = ', '.join(f'{name} {ms} ms' for name, ms in t['mobile_ms'].items())
+        print(f"  {encoding:<9} {t['wire_bytes'] / 1024:>6.1f} KB  {mobile}")
+    print(f"\npeak RSS: {report['peak_rss_mb']} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('-s', '--scenario', action='append', choices=SCENARIOS,
+                        help='scenario to run (repeatable; default: all)')
+    parser.add_argument('-n', '--requests', type=int, default=24, help='requests per scenario')
+    parser.add_argument('-c', '--concurrency', type=int, default=4)
+    parser.add_argument('--latency', type=float, default=0.3, help='fake Groq time to first token (s)')
+    parser.add_argument('--token-rate', type=float, default=2000.0, help='fake Groq output tokens/s')
+    parser.add_argument('--rate-limit', type=float, default=0.0, help='probability of a Groq 429')
+    parser.add_argument('--truncate', type=float, default=0.0, help='probability of a cut-off output')
+    parser.add_argument('--site-latency', type=float, default=0.05, help='fixture server delay (s)')
+    parser.add_argument('--timeout', type=float, default=120.0, help='per-request client timeout (s)')
+    parser.add_argument('--cache', action='store_true', help='leave the lesson cache and article store on')
+    parser.add_argument('--schema', choices=['v1', 'v2'], default='v2', help='lesson output schema')
+    parser.add_argument('--no-preprocess', action='store_true', help='skip local sentence splitting')
+    parser.add_argument('--asyncio', action='store_true', help='serve through server.py instead of http.server')
+    parser.add_argument('--cpu-workers', type=int, default=2, help='server.py parsing processes (--asyncio)')
+    parser.add_argument('--encoding', choices=['br', 'gzip', 'identity'],
+                        default='br' if importlib.util.find_spec('brotli') else 'gzip',
+                        help='Accept-Encoding the clients send')
+    parser.add_argument('--json', metavar='PATH', help='also write the report as JSON')
+    args = parser.parse_args()
+
+    groq, urls, targets, pdfs = setup(args)
+    report = {'config': vars(args), 'scenarios': []}
+    for scenario in args.scenario or SCENARIOS:
+        report['scenarios'].append(run_scenario(scenario, args, urls, targets, pdfs, groq))
+    report['index_html'] = index_transfer(sys.modules['_lib.delivery'])
+    report['peak_rss_mb'] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+    print_report(report)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+"""Serve the recorded fixtures in place of Deutschlandfunk and other sites.
+
+    /rss/<feed>.rss          bench/fixtures/rss     ({base} -> this server's URL)
+    /articles/<slug>.html    bench/fixtures/articles
+    /pages/<name>.html       bench/fixtures/pages   (generic sites, URL mode)
+    /pdf/<name>.pdf          bench/fixtures/pdf
+
+RSS responses carry an ETag and honour If-None-Match, like the real feeds.
+
+    python bench/static_server.py --port 8082
+"""
+import argparse
+import hashlib
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+TYPES = {'.rss': 'application/rss+xml', '.html': 'text/html; charset=utf-8', '.pdf': 'application/pdf'}
+DIRS = {'rss', 'articles', 'pages', 'pdf'}
+
+
+class StaticHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        parts = self.path.split('?', 1)[0].strip('/').split('/')
+        path = os.path.join(FIXTURES, *parts) if len(parts) == 2 and parts[0] in DIRS else None
+        if not path or not os.path.isfile(path):
+            self._send(404, b'not found', 'text/plain')
+            return
+        with open(path, 'rb') as f:
+            body = f.read()
+        if parts[0] == 'rss':
+            body = body.replace(b'{base}', self.server.base_url.encode())
+        etag = '"' + hashlib.md5(body).hexdigest() + '"'
+        if self.headers.get('If-None-Match') == etag:
+            self._send(304, b'', None, etag)
+            return
+        time.sleep(self.server.latency)
+        self._send(200, body, TYPES.get(os.path.splitext(path)[1], 'application/octet-stream'), etag)
+
+    def _send(self, status, body, ctype, etag=None):
+        self.send_response(status)
+        if ctype:
+            self.send_header('Content-Type', ctype)
+        if etag:
+            self.send_header('ETag', etag)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def serve(host='127.0.0.1', port=0, latency=0.0):
+    """Start the fixture server on a daemon thread; returns the server object."""
+    server = ThreadingHTTPServer((host, port), StaticHandler)
+    server.daemon_threads = True
+    server.latency = latency
+    server.base_url = f'http://{host}:{server.server_port}'
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def feed_urls(server):
+    """URLs of every recorded feed on `server`, in a stable order."""
+    names = sorted(n for n in os.listdir(os.path.join(FIXTURES, 'rss')) if n.endswith('.rss'))
+    return [f'{server.base_url}/rss/{n}' for n in names]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8082)
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds added to every 200')
+    args = parser.parse_args()
+    server = serve(args.host, args.port, args.latency)
+    print(f'fixtures on {server.base_url}')
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,309 @@
+"""Self-hosted server for the API routes and index.html, on asyncio.
+
+    python server.py --port 8000
+    python server.py --host 0.0.0.0 --max-active 512 --cpu-workers 4
+
+On Vercel every request gets an instance of its own. Run here instead, one
+process serves /api, /api/process-custom and /api/batch with the same
+handler classes and the same request/response contract (SSE streaming
+included):
+
+- The event loop reads requests, queues them and writes responses. It never
+  blocks.
+- Each admitted request runs its handler on a thread from a pool of
+  --max-active. While a thread waits on Groq or a news site it holds no
+  lock, so hundreds of lessons can be in flight at once.
+- PDF extraction and HTML parsing go to a process pool (_lib/cpu.py), so
+  they do not serialize on the GIL.
+- Requests beyond --max-active wait in a queue of up to --max-queue. Past
+  that they get a 503 with Retry-After straight away. Slow or oversized
+  requests are cut off.
+- SIGINT/SIGTERM stop accepting connections, then give running requests
+  --grace seconds to finish.
+- index.html is compressed once at startup (brotli/gzip) and sent with a
+  strong ETag and `Cache-Control: no-cache`, so a browser revalidates it
+  and usually gets a bodyless 304.
+"""
+import argparse
+import asyncio
+import importlib.util
+import io
+import json
+import multiprocessing
+import os
+import signal
+import site
+import sys
+import traceback
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+API = os.path.join(ROOT, 'api')
+
+MAX_ACTIVE = int(os.environ.get('SERVER_MAX_ACTIVE', 256))
+MAX_QUEUE = int(os.environ.get('SERVER_MAX_QUEUE', 1024))
+HEADER_TIMEOUT = float(os.environ.get('SERVER_HEADER_TIMEOUT', 15))
+BODY_TIMEOUT = float(os.environ.get('SERVER_BODY_TIMEOUT', 60))
+SHUTDOWN_GRACE = float(os.environ.get('SERVER_SHUTDOWN_GRACE', 30))
+RETRY_AFTER = 5             # seconds, sent with 503 when the queue is full
+
+ROUTES = {
+    '/api': 'index.py',
+    '/api/index': 'index.py',
+    '/api/process-custom': 'process-custom.py',
+    '/api/batch': 'batch.py',
+}
+
+
+def load_handlers(routes=ROUTES):
+    """`{path: handler class}` for each API file, loaded once per file."""
+    modules = {}
+    handlers = {}
+    for path, filename in routes.items():
+        if filename not in modules:
+            name = 'api_' + os.path.splitext(filename)[0].replace('-', '_')
+            spec = importlib.util.spec_from_file_location(name, os.path.join(API, filename))
+            module = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(module)
+            modules[filename] = module
+        handlers[path] = modules[filename].handler
+    return handlers
+
+
+class LoopWriter:
+    """File-like `wfile` for a handler thread; writes go out through the event loop.
+
+    Every write waits for the transport to drain, so a slow client slows down
+    its own handler instead of growing a buffer.
+    """
+
+    def __init__(self, loop, writer):
+        self.loop = loop
+        self.writer = writer
+
+    async def _send(self, data):
+        self.writer.write(data)
+        await self.writer.drain()
+
+    def write(self, data):
+        if data:
+            asyncio.run_coroutine_threadsafe(self._send(bytes(data)), self.loop).result()
+        return len(data)
+
+    def flush(self):
+        pass
+
+
+def dispatch(handler_class, raw, wfile, client_address):
+    """Run one request through a BaseHTTPRequestHandler subclass, socket-free."""
+    h = handler_class.__new__(handler_class)
+    h.request, h.server, h.client_address = None, None, client_address
+    h.rfile = io.BytesIO(raw)
+    h.wfile = wfile
+    h.close_connection = True
+    try:
+        h.handle_one_request()
+    except ConnectionError:
+        pass            # the client went away mid-response
+    except Exception:
+        traceback.print_exc()
+
+
+class App:
+    """Admission control and routing in front of the handler threads."""
+
+    def __init__(self, handlers, max_active=MAX_ACTIVE, max_queue=MAX_QUEUE,
+                 max_body=None, index_html=None):
+        from _lib.delivery import compress, encodings, strong_etag
+        from _lib.upload import MAX_UPLOAD_BYTES
+        self.handlers = handlers
+        self.max_queue = max_queue
+        # A base64 PDF inside JSON is a third bigger than the file.
+        self.max_body = max_body or MAX_UPLOAD_BYTES * 4 // 3 + 64 * 1024
+        self.index_html = index_html
+        self.index_etag = index_html and strong_etag(index_html)
+        self.index_variants = {encoding: compress(index_html, encoding, best=True)
+                               for encoding in encodings()} if index_html else {}
+        self.threads = ThreadPoolExecutor(max_workers=max_active, thread_name_prefix='request')
+        self.slots = asyncio.Semaphore(max_active)
+        self.waiting = 0
+        self.connections = set()
+
+    async def handle(self, reader, writer):
+        task = asyncio.current_task()
+        self.connections.add(task)
+        try:
+            await self._handle(reader, writer)
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.LimitOverrunError,
+                asyncio.TimeoutError):
+            pass
+        finally:
+            self.connections.discard(task)
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def _handle(self, reader, writer):
+        head = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), HEADER_TIMEOUT)
+        request_line, _, header_block = head.partition(b'\r\n')
+        parts = request_line.decode('latin-1').split()
+        if len(parts) != 3:
+            await self._reply(writer, 400, {'success': False, 'error': 'Bad request'})
+            return
+        method, target = parts[0], parts[1]
+        path = urlsplit(target).path.rstrip('/') or '/'
+
+        length = 0
+        request_headers = {}
+        for line in header_block.split(b'\r\n'):
+            name, _, value = line.partition(b':')
+            name = name.strip().lower()
+            if name in (b'accept-encoding', b'if-none-match'):
+                request_headers[name.decode('latin-1')] = value.strip().decode('latin-1')
+            if name == b'content-length':
+                value = value.strip()
+                if not value.isdigit():
+                    await self._reply(writer, 400, {'success': False, 'error': 'Invalid Content-Length'})
+                    return
+                length = int(value)
+            elif name == b'transfer-encoding' and b'chunked' in value.lower():
+                await self._reply(writer, 411, {'success': False, 'error': 'Content-Length required'})
+                return
+        if length > self.max_body:
+            await self._reply(writer, 413, {'success': False, 'error': 'Request too large'})
+            return
+        body = await asyncio.wait_for(reader.readexactly(length), BODY_TIMEOUT) if length else b''
+
+        if path in ('/', '/index.html') and method in ('GET', 'HEAD') and self.index_html:
+            await self._send_index(writer, method, request_headers)
+            return
+        handler_class = self.handlers.get(path)
+        if handler_class is None:
+            await self._reply(writer, 404, {'success': False, 'error': 'Not found'})
+            return
+        if self.slots.locked() and self.waiting >= self.max_queue:
+            await self._reply(writer, 503, {'success': False, 'error': 'Server busy, please try again.'},
+                              {'Retry-After': str(RETRY_AFTER)})
+            return
+
+        self.waiting += 1
+        try:
+            await self.slots.acquire()
+        finally:
+            self.waiting -= 1
+        try:
+            loop = asyncio.get_running_loop()
+            peer = writer.get_extra_info('peername') or ('', 0)
+            await loop.run_in_executor(self.threads, dispatch, handler_class, head + body,
+                                       LoopWriter(loop, writer), peer[:2])
+        finally:
+            self.slots.release()
+        await writer.drain()
+
+    async def _send_index(self, writer, method, request_headers):
+        from _lib.delivery import accepted_encoding, etag_matches
+        headers = {'Cache-Control': 'no-cache', 'Vary': 'Accept-Encoding', 'ETag': self.index_etag}
+        encoding = accepted_encoding(request_headers.get('accept-encoding'))
+        if encoding in self.index_variants:
+            headers['ETag'] = f'{self.index_etag[:-1]}-{encoding}"'
+        if etag_matches(request_headers.get('if-none-match'), self.index_etag):
+            await self._send(writer, 304, None, b'', headers)
+            return
+        body = self.index_variants.get(encoding, self.index_html)
+        if encoding in self.index_variants:
+            headers['Content-Encoding'] = encoding
+        await self._send(writer, 200, 'text/html; charset=utf-8', body, headers,
+                         head=method == 'HEAD')
+
+    async def _reply(self, writer, status, data, headers=None):
+        body = json.dumps(data, separators=(',', ':')).encode()
+        await self._send(writer, status, 'application/json', body, headers)
+
+    async def _send(self, writer, status, content_type, body, headers=None, head=False):
+        lines = [f'HTTP/1.1 {status} {_REASONS.get(status, "")}']
+        if content_type:
+            lines.append(f'Content-Type: {content_type}')
+        lines += [f'Content-Length: {len(body)}',
+                  'Access-Control-Allow-Origin: *',
+                  'Connection: close']
+        lines += [f'{name}: {value}' for name, value in (headers or {}).items()]
+        writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + (b'' if head else body))
+        await writer.drain()
+
+    def close(self):
+        self.threads.shutdown(wait=False, cancel_futures=True)
+
+
+_REASONS = {200: 'OK', 304: 'Not Modified', 400: 'Bad Request', 404: 'Not Found', 411: 'Length Required',
+            413: 'Payload Too Large', 503: 'Service Unavailable'}
+
+def start_cpu_pool(workers):
+    """Process pool for _lib/cpu.py; workers import _lib from api/."""
+    from _lib import cpu
+    if workers <= 0:
+        return None
+    pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                               initializer=site.addsitedir, initargs=(API,))
+    cpu.use_pool(pool)
+    return pool
+
+
+async def serve(app, host, port, stop=None, grace=SHUTDOWN_GRACE, ready=None):
+    """Serve `app` until `stop` is set (by default on SIGINT/SIGTERM), then drain."""
+    loop = asyncio.get_running_loop()
+    if stop is None:
+        stop = asyncio.Event()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, stop.set)
+    server = await asyncio.start_server(app.handle, host, port, backlog=1024)
+    if ready:
+        ready(server.sockets[0].getsockname()[1])
+    await stop.wait()
+
+    server.close()
+    await server.wait_closed()
+    if app.connections:
+        await asyncio.wait(set(app.connections), timeout=grace)
+    app.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve the lesson API and index.html from one process.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=int(os.environ.get('PORT', 8000)))
+    parser.add_argument('--max-active', type=int, default=MAX_ACTIVE, help='requests handled at once')
+    parser.add_argument('--max-queue', type=int, default=MAX_QUEUE, help='requests waiting for a slot')
+    parser.add_argument('--cpu-workers', type=int, default=None,
+                        help='processes for PDF/HTML parsing (0 = in the request thread)')
+    parser.add_argument('--grace', type=float, default=SHUTDOWN_GRACE, help='shutdown drain time (s)')
+    args = parser.parse_args()
+
+    # One keep-alive connection per active request to each upstream host, and
+    # scrape threads for a primary and a hedged backup per active request.
+    os.environ.setdefault('HTTP_POOL_PER_HOST', str(args.max_active))
+    os.environ.setdefault('SCRAPE_WORKERS', str(2 * args.max_active))
+    sys.path.insert(0, API)
+    from _lib.cpu import CPU_WORKERS
+
+    handlers = load_handlers()
+    with open(os.path.join(ROOT, 'index.html'), 'rb') as f:
+        index_html = f.read()
+    pool = start_cpu_pool(CPU_WORKERS if args.cpu_workers is None else args.cpu_workers)
+
+    async def run():
+        app = App(handlers, args.max_active, args.max_queue, index_html=index_html)
+        await serve(app, args.host, args.port, grace=args.grace,
+                    ready=lambda port: print(f'Serving on http://{args.host}:{port}/', file=sys.stderr))
+
+    try:
+        asyncio.run(run())
+    finally:
+        if pool:
+            pool.shutdown(cancel_futures=True)
+
+
+if __name__ == '__main__':
+    main()